@@ -1,38 +1,203 @@
+from typing import List, Optional, Tuple
 from mempool import Mempool
 from utxo_manager import UTXOManager
 from transaction import Transaction
+from utxo_view import UTXOView
+import hashlib
+import json
 import time
 
+
+class Block:
+    def __init__(self, transactions: List[Transaction], miner_address: str,
+                 coinbase_id: Optional[str] = None, total_fees: float = 0.0,
+                 prev_hash: Optional[str] = None, height: int = 0,
+                 timestamp: Optional[float] = None):
+        self.transactions = transactions
+        self.miner_address = miner_address
+        self.coinbase_id = coinbase_id
+        self.total_fees = total_fees
+        self.prev_hash = prev_hash
+        self.height = height
+        self.timestamp = timestamp if timestamp is not None else time.time()
+        self.block_hash = self.compute_hash()
+        # outputs spent by this block, kept so it can be disconnected again
+        self.spent_outputs = []   # (tx_id, index, amount, owner)
+        self.utxo_commitment = None   # UTXO set hash after this block is applied
+        self.commitment_memo = {}     # shared commitment deltas, see UTXOManager.end_batch
+
+    def compute_hash(self) -> str:
+        header = [self.prev_hash, self.height, self.miner_address, self.coinbase_id,
+                  self.total_fees, self.timestamp, [tx.tx_id for tx in self.transactions]]
+        return hashlib.sha256(json.dumps(header).encode()).hexdigest()
+
+    @property
+    def size_bytes(self) -> int:
+        # 80 byte header plus the transactions
+        return 80 + sum(tx.size_bytes for tx in self.transactions)
+
+
 def mine_block(miner_address: str, mempool: Mempool,
-               utxo_manager: UTXOManager, num_txs: int = 5):
+               utxo_manager: UTXOManager, num_txs: int = 5,
+               prev_block: Optional[Block] = None,
+               timestamp: Optional[float] = None) -> Optional[Block]:
 
     selected_txs = mempool.get_top_transactions(num_txs)
+
+    # A tx whose inputs left the UTXO set (e.g. spent by a block that bypassed
+    # this mempool) can never be mined; evict it and mine the rest
+    known = utxo_manager.get_amounts(
+        [(inp["prev_tx"], inp["index"]) for tx in selected_txs for inp in tx.inputs]
+    )
+    stale = [tx for tx in selected_txs
+             if any((inp["prev_tx"], inp["index"]) not in known for inp in tx.inputs)]
+    for tx in stale:
+        mempool.remove_transaction(tx.tx_id)
+        selected_txs.remove(tx)
     if not selected_txs:
-        return
+        return None
 
-    total_fees = 0.0
+    if timestamp is None:
+        timestamp = time.time()
+    height = prev_block.height + 1 if prev_block is not None else mempool.height + 1
+    total_fees = sum(tx.fee for tx in selected_txs)
 
-    for tx in selected_txs:
+    # Create coinbase transaction for miner reward (fees only, no block reward in this simulation)
+    coinbase_id = None
+    if total_fees > 0:
+        coinbase_id = f"coinbase_{miner_address}_{height}_{int(timestamp)}"
+
+    block = Block(selected_txs, miner_address, coinbase_id, total_fees,
+                  prev_hash=prev_block.block_hash if prev_block is not None else None,
+                  height=height, timestamp=timestamp)
+
+    is_valid, _ = connect_block(block, mempool, utxo_manager, block.spent_outputs)
+    if not is_valid:
+        return None
+    block.utxo_commitment = utxo_manager.get_commitment()
+    return block
+
+
+def check_block(block: Block, utxo_manager: UTXOManager) -> Tuple[bool, str]:
+    """Check a block against the UTXO set without changing anything"""
+    # one batched lookup for every input the block spends
+    known = utxo_manager.get_amounts(
+        [(inp["prev_tx"], inp["index"]) for tx in block.transactions for inp in tx.inputs]
+    )
+    created = {}   # outputs created earlier in this block
+    spent = set()
+    fees = 0.0
+
+    for tx in block.transactions:
+        input_amt = 0.0
         for inp in tx.inputs:
-            utxo_manager.remove_utxo(inp["prev_tx"], inp["index"])
+            key = (inp["prev_tx"], inp["index"])
+            if key in spent:
+                return False, f"Block double-spends UTXO {key}"
+            if key in created:
+                input_amt += created[key]
+            elif key in known:
+                input_amt += known[key]
+            else:
+                return False, f"UTXO {key[0]}:{key[1]} does not exist"
+            spent.add(key)
 
+        output_amt = 0.0
         for idx, out in enumerate(tx.outputs):
-            utxo_manager.add_utxo(
-                tx.tx_id,
-                idx,
-                out["amount"],
-                out["address"]
-            )
-
-        total_fees += tx.fee
-        mempool.remove_transaction(tx.tx_id)
+            if out["amount"] < 0:
+                return False, "Negative output amount detected"
+            created[(tx.tx_id, idx)] = out["amount"]
+            output_amt += out["amount"]
 
-    # Create coinbase transaction for miner reward (fees only, no block reward in this simulation)
-    if total_fees > 0:
-        coinbase_id = f"coinbase_{miner_address}_{int(time.time())}"
-        utxo_manager.add_utxo(
-            coinbase_id,
-            0,
-            total_fees,
-            miner_address
-        )
+        if input_amt < output_amt:
+            return False, f"Insufficient input amount in {tx.tx_id}"
+        fees += input_amt - output_amt
+
+    if block.total_fees > fees + 0.00000001:
+        return False, "Coinbase claims more than the block's fees"
+    return True, "Block is valid"
+
+
+def block_changes(block: Block) -> list:
+    """The block's effect on the UTXO set as an ordered list of spend/add ops"""
+    ops = []
+    for tx in block.transactions:
+        for inp in tx.inputs:
+            ops.append(("spend", inp["prev_tx"], inp["index"]))
+        for idx, out in enumerate(tx.outputs):
+            ops.append(("add", tx.tx_id, idx, out["amount"], out["address"]))
+    if block.coinbase_id is not None:
+        ops.append(("add", block.coinbase_id, 0, block.total_fees, block.miner_address))
+    return ops
+
+
+def connect_block(block: Block, mempool: Mempool, utxo_manager: UTXOManager,
+                  spent_outputs: Optional[list] = None) -> Tuple[bool, str]:
+    """
+    Validate a block and apply it to the UTXO set and mempool.
+    Spent outputs are appended to `spent_outputs` so the caller can disconnect
+    the block later; nothing is changed if the block is invalid.
+    """
+    is_valid, msg = check_block(block, utxo_manager)
+    if not is_valid:
+        return False, msg
+
+    try:
+        spent = utxo_manager.apply_changes(block_changes(block),
+                                           block.commitment_memo.setdefault("connect", {}))
+    except ValueError as e:
+        return False, str(e)
+    if spent_outputs is not None:
+        spent_outputs.extend(spent)
+
+    mempool.block_connected(block)
+    return True, "Block is valid"
+
+
+def undo_changes(block: Block, spent_outputs: list) -> list:
+    """Ops that take a connected block back out of the UTXO set"""
+    # outputs both created and spent inside the block are already gone
+    block_tx_ids = {tx.tx_id for tx in block.transactions}
+    spent_inside = {(tx_id, index) for tx_id, index, _, _ in spent_outputs
+                    if tx_id in block_tx_ids}
+
+    ops = []
+    if block.coinbase_id is not None:
+        ops.append(("spend", block.coinbase_id, 0))
+    for tx in reversed(block.transactions):
+        for idx in range(len(tx.outputs)):
+            if (tx.tx_id, idx) not in spent_inside:
+                ops.append(("spend", tx.tx_id, idx))
+    for tx_id, index, amount, owner in spent_outputs:
+        if tx_id not in block_tx_ids:
+            ops.append(("add", tx_id, index, amount, owner))
+    return ops
+
+
+def disconnect_block(block: Block, mempool: Mempool, utxo_manager: UTXOManager,
+                     spent_outputs: Optional[list] = None):
+    """Undo a mined block: roll back the UTXO set and return its transactions to the mempool"""
+    if spent_outputs is None:
+        spent_outputs = block.spent_outputs
+    utxo_manager.apply_changes(undo_changes(block, spent_outputs),
+                               block.commitment_memo.setdefault("disconnect", {}))
+
+    return mempool.block_disconnected(block)
+
+
+def validate_block(block: Block, utxo_manager: UTXOManager) -> Tuple[bool, str]:
+    """
+    Fully validate a candidate block by applying it to a throwaway UTXOView.
+    The real UTXO set is never touched, and the view is dropped in O(1).
+    """
+    is_valid, msg = check_block(block, utxo_manager)
+    if not is_valid:
+        return False, msg
+    view = UTXOView(utxo_manager)
+    try:
+        view.apply_changes(block_changes(block))
+    except ValueError as e:
+        return False, str(e)
+    finally:
+        view.discard()
+    return True, "Block is valid"
@@ -0,0 +1,492 @@
+"""
+Flat-file block storage with an on-disk block/tx index.
+
+Blocks are appended to numbered files (blk00000.dat, blk00001.dat, ...) that
+rotate once they reach max_file_size. Each file grows in preallocated chunks
+so the filesystem is not extending it on every write, and records go through
+a large write buffer. When a file is finished it is trimmed to its real size.
+
+Record layout:
+
+    magic (4 bytes) | payload size (uint32 LE) | payload
+
+The payload is one JSON line for the header (block fields plus the undo data
+needed to disconnect it), followed by one JSON line per transaction. Because
+each transaction is its own line, the index can point straight at it.
+
+The index is a SQLite database next to the files. It maps block hash to
+(file, offset, length), height to the hash on the active chain, and txid to
+the (file, offset, length) of that transaction's line, so any block or
+transaction is one seek and one read away. Index rows are committed in
+flush(), after the data they point at has been written, so after a crash the
+index never points past the data; anything written after the last flush is
+simply overwritten.
+
+reindex() ignores the index, streams the files sequentially, rebuilds the
+index and replays the chain into a fresh UTXO set. Each stored block became
+the tip when it was written, so replay makes it the tip again, reorganizing
+onto it with the undo data kept in the records when it is on another branch.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import struct
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from block import Block, block_changes, check_block, undo_changes
+from transaction import Transaction
+from utxo_manager import UTXOManager
+from utxo_view import UTXOView
+
+MAGIC = b"\xf9\xbe\xb4\xd9"
+RECORD_HEADER = struct.Struct("<4sI")
+
+MAX_FILE_SIZE = 128 * 1024 * 1024   # start a new blk file past this
+PREALLOC_CHUNK = 16 * 1024 * 1024   # grow files in steps of this
+WRITE_BUFFER = 1024 * 1024
+READ_BUFFER = 8 * 1024 * 1024       # sequential scans during reindex
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blocks (
+    hash TEXT PRIMARY KEY, height INTEGER, prev_hash TEXT,
+    file INTEGER, offset INTEGER, length INTEGER);
+CREATE TABLE IF NOT EXISTS chain (height INTEGER PRIMARY KEY, hash TEXT);
+CREATE TABLE IF NOT EXISTS txs (
+    txid TEXT PRIMARY KEY, block_hash TEXT, file INTEGER, offset INTEGER, length INTEGER);
+CREATE TABLE IF NOT EXISTS files (file INTEGER PRIMARY KEY, size INTEGER, blocks INTEGER);
+"""
+
+
+def tx_to_dict(tx: Transaction) -> Dict:
+    return {"tx_id": tx.tx_id, "inputs": tx.inputs, "outputs": tx.outputs,
+            "fee": tx.fee, "fee_rate": tx.fee_rate}
+
+
+def tx_from_dict(data: Dict) -> Transaction:
+    tx = Transaction(data["tx_id"], data["inputs"], data["outputs"])
+    tx.fee = data["fee"]
+    tx.fee_rate = data["fee_rate"]
+    return tx
+
+
+def serialize_block(block: Block) -> Tuple[bytes, List[Tuple[int, int]]]:
+    """
+    Payload bytes for a block, plus (offset, length) of each transaction
+    line relative to the start of the payload.
+    """
+    header = {
+        "hash": block.block_hash, "prev_hash": block.prev_hash, "height": block.height,
+        "miner": block.miner_address, "coinbase_id": block.coinbase_id,
+        "total_fees": block.total_fees, "timestamp": block.timestamp,
+        "utxo_commitment": block.utxo_commitment, "undo": block.spent_outputs,
+        "tx_count": len(block.transactions),
+    }
+    lines = [json.dumps(header).encode()]
+    lines.extend(json.dumps(tx_to_dict(tx)).encode() for tx in block.transactions)
+    return b"\n".join(lines) + b"\n", _tx_spans(lines)
+
+
+def _tx_spans(lines: List) -> List[Tuple[int, int]]:
+    # lines are ASCII (json.dumps escapes everything else), so str length == byte length
+    spans = []
+    offset = len(lines[0]) + 1
+    for line in lines[1:]:
+        spans.append((offset, len(line)))
+        offset += len(line) + 1
+    return spans
+
+
+def deserialize_block(payload: bytes) -> Block:
+    return _parse_lines(payload.decode().split("\n"))
+
+
+def _parse_lines(lines: List[str]) -> Block:
+    header = json.loads(lines[0])
+    txs = [tx_from_dict(json.loads(line)) for line in lines[1:1 + header["tx_count"]]]
+    block = Block(txs, header["miner"], header["coinbase_id"], header["total_fees"],
+                  prev_hash=header["prev_hash"], height=header["height"],
+                  timestamp=header["timestamp"])
+    if block.block_hash != header["hash"]:
+        raise ValueError(f"Stored block {header['hash']} does not match its contents")
+    block.spent_outputs = [tuple(entry) for entry in header["undo"]]
+    block.utxo_commitment = header["utxo_commitment"]
+    return block
+
+
+class BlockStore:
+    def __init__(self, directory: str, max_file_size: int = MAX_FILE_SIZE,
+                 prealloc_chunk: int = PREALLOC_CHUNK, write_buffer: int = WRITE_BUFFER):
+        self.directory = directory
+        self.max_file_size = max_file_size
+        self.prealloc_chunk = prealloc_chunk
+        self.write_buffer = write_buffer
+        os.makedirs(directory, exist_ok=True)
+
+        # one user at a time, but not necessarily the thread that opened it (see rpc_server)
+        self.db = sqlite3.connect(os.path.join(directory, "index.sqlite"), check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self._readers: Dict[int, object] = {}
+        self._writer = None
+        self._dirty = False   # written to the current file since the last flush
+
+        row = self.db.execute("SELECT file, size, blocks FROM files ORDER BY file DESC LIMIT 1").fetchone()
+        self.file_no, self.pos, self.file_blocks = row if row is not None else (0, 0, 0)
+        self.allocated = 0
+        tip = self.db.execute("SELECT hash FROM chain ORDER BY height DESC LIMIT 1").fetchone()
+        self.tip_hash: Optional[str] = tip[0] if tip is not None else None
+
+    def _path(self, file_no: int) -> str:
+        return os.path.join(self.directory, f"blk{file_no:05d}.dat")
+
+    def _files_on_disk(self) -> List[int]:
+        numbers = []
+        for name in os.listdir(self.directory):
+            if name.startswith("blk") and name.endswith(".dat"):
+                numbers.append(int(name[3:-4]))
+        return sorted(numbers)
+
+    # writing
+
+    def _open_writer(self):
+        path = self._path(self.file_no)
+        mode = "r+b" if os.path.exists(path) else "w+b"
+        self._writer = open(path, mode, buffering=self.write_buffer)
+        self._writer.seek(self.pos)
+        self.allocated = os.fstat(self._writer.fileno()).st_size
+
+    def _reserve(self, end: int):
+        """Make sure the current file is allocated up to `end`, a chunk at a time"""
+        if end <= self.allocated:
+            return
+        size = min(-(-end // self.prealloc_chunk) * self.prealloc_chunk,
+                   max(self.max_file_size, end))
+        fd = self._writer.fileno()
+        if hasattr(os, "posix_fallocate"):
+            os.posix_fallocate(fd, self.allocated, size - self.allocated)
+        else:
+            os.ftruncate(fd, size)
+        self.allocated = size
+
+    def _finish_file(self):
+        """Flush the current file and trim its unused preallocated tail"""
+        self._writer.flush()
+        os.ftruncate(self._writer.fileno(), self.pos)
+        self._writer.close()
+        self._writer = None
+        self._close_reader(self.file_no)
+
+    def add_block(self, block: Block) -> Tuple[int, int]:
+        """
+        Append a block and index it. The block becomes the new tip: the active
+        chain is cut back to its parent's height before it is added.
+        Returns (file number, offset) of the record.
+        """
+        payload, tx_spans = serialize_block(block)
+        length = RECORD_HEADER.size + len(payload)
+        if self._writer is None:
+            self._open_writer()
+        if self.pos > 0 and self.pos + length > self.max_file_size:
+            self._finish_file()
+            self.db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?)",
+                            (self.file_no, self.pos, self.file_blocks))
+            self.file_no, self.pos, self.file_blocks = self.file_no + 1, 0, 0
+            self._open_writer()
+
+        offset = self.pos
+        self._reserve(offset + length)
+        self._writer.write(RECORD_HEADER.pack(MAGIC, len(payload)))
+        self._writer.write(payload)
+        self.pos += length
+        self.file_blocks += 1
+        self._dirty = True
+
+        self._index_block(block.block_hash, block.height, block.prev_hash,
+                          self.file_no, offset, length,
+                          [tx.tx_id for tx in block.transactions], tx_spans)
+        self.db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?)",
+                        (self.file_no, self.pos, self.file_blocks))
+        return self.file_no, offset
+
+    def _index_block(self, block_hash: str, height: int, prev_hash: Optional[str],
+                     file_no: int, offset: int, length: int,
+                     tx_ids: List[str], tx_spans: List[Tuple[int, int]], on_chain: bool = True):
+        self.db.execute("INSERT OR REPLACE INTO blocks VALUES (?, ?, ?, ?, ?, ?)",
+                        (block_hash, height, prev_hash, file_no, offset, length))
+        payload_start = offset + RECORD_HEADER.size
+        self.db.executemany("INSERT OR REPLACE INTO txs VALUES (?, ?, ?, ?, ?)",
+                            [(tx_id, block_hash, file_no, payload_start + tx_offset, tx_length)
+                             for tx_id, (tx_offset, tx_length) in zip(tx_ids, tx_spans)])
+        if on_chain:
+            self._set_chain([(height, block_hash)])
+
+    def _set_chain(self, blocks: List[Tuple[int, str]]):
+        """Make (height, hash) pairs, lowest first, the top of the active chain"""
+        self.db.execute("DELETE FROM chain WHERE height >= ?", (blocks[0][0],))
+        self.db.executemany("INSERT INTO chain VALUES (?, ?)", blocks)
+        self.tip_hash = blocks[-1][1]
+
+    def flush(self, sync: bool = False):
+        """Write buffered records to disk, then commit the index rows that point at them"""
+        if self._writer is not None and self._dirty:
+            self._writer.flush()
+            if sync:
+                os.fsync(self._writer.fileno())
+            self._dirty = False
+        self.db.commit()
+
+    def close(self):
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        for file_no in list(self._readers):
+            self._close_reader(file_no)
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # reading
+
+    def _close_reader(self, file_no: int):
+        reader = self._readers.pop(file_no, None)
+        if reader is not None:
+            reader.close()
+
+    def _read(self, file_no: int, offset: int, length: int) -> bytes:
+        if file_no == self.file_no and self._dirty:
+            self._writer.flush()   # the record may still be in the write buffer
+            self._dirty = False
+        reader = self._readers.get(file_no)
+        if reader is None:
+            reader = self._readers[file_no] = open(self._path(file_no), "rb", buffering=0)
+        reader.seek(offset)
+        return reader.read(length)
+
+    def _read_record(self, file_no: int, offset: int, length: int) -> Block:
+        data = self._read(file_no, offset, length)
+        magic, size = RECORD_HEADER.unpack_from(data)
+        if magic != MAGIC or size != length - RECORD_HEADER.size:
+            raise ValueError(f"Corrupt record at blk{file_no:05d}.dat:{offset}")
+        return deserialize_block(data[RECORD_HEADER.size:])
+
+    def get_block(self, block_hash: str) -> Optional[Block]:
+        row = self.db.execute("SELECT file, offset, length FROM blocks WHERE hash = ?",
+                              (block_hash,)).fetchone()
+        return self._read_record(*row) if row is not None else None
+
+    def get_block_hash(self, height: int) -> Optional[str]:
+        row = self.db.execute("SELECT hash FROM chain WHERE height = ?", (height,)).fetchone()
+        return row[0] if row is not None else None
+
+    def get_block_by_height(self, height: int) -> Optional[Block]:
+        row = self.db.execute(
+            "SELECT b.file, b.offset, b.length FROM chain c JOIN blocks b ON b.hash = c.hash "
+            "WHERE c.height = ?", (height,)).fetchone()
+        return self._read_record(*row) if row is not None else None
+
+    def get_transaction(self, tx_id: str) -> Optional[Tuple[Transaction, str]]:
+        """The transaction and the hash of the block it was stored in"""
+        row = self.db.execute("SELECT file, offset, length, block_hash FROM txs WHERE txid = ?",
+                              (tx_id,)).fetchone()
+        if row is None:
+            return None
+        return tx_from_dict(json.loads(self._read(row[0], row[1], row[2]))), row[3]
+
+    @property
+    def tip(self) -> Optional[Block]:
+        return self.get_block(self.tip_hash) if self.tip_hash is not None else None
+
+    @property
+    def height(self) -> int:
+        row = self.db.execute("SELECT MAX(height) FROM chain").fetchone()
+        return row[0] if row[0] is not None else 0
+
+    def load_utxo(self, utxo_manager: Optional[UTXOManager] = None) -> UTXOManager:
+        """Rebuild the UTXO set by replaying the active chain through the index"""
+        utxo = utxo_manager if utxo_manager is not None else UTXOManager()
+        chain_state = UTXOView(utxo)
+        for row in self.db.execute(
+                "SELECT b.file, b.offset, b.length FROM chain c JOIN blocks b ON b.hash = c.hash "
+                "ORDER BY c.height").fetchall():
+            chain_state.apply_changes(block_changes(self._read_record(*row)))
+        chain_state.flush()
+        return utxo
+
+    # sequential scan
+
+    def scan(self) -> Iterator[Tuple[int, int, int, bytes]]:
+        """
+        Stream every record in file order as (file, offset, length, payload),
+        without using the index. A file ends at its first bad magic, which is
+        where the preallocated zeros (or a torn write) begin.
+        """
+        self.flush()
+        for file_no in self._files_on_disk():
+            with open(self._path(file_no), "rb", buffering=READ_BUFFER) as f:
+                offset = 0
+                while True:
+                    head = f.read(RECORD_HEADER.size)
+                    if len(head) < RECORD_HEADER.size:
+                        break
+                    magic, size = RECORD_HEADER.unpack(head)
+                    if magic != MAGIC:
+                        break
+                    payload = f.read(size)
+                    if len(payload) < size:
+                        break
+                    yield file_no, offset, RECORD_HEADER.size + size, payload
+                    offset += RECORD_HEADER.size + size
+
+    def reindex(self, utxo_manager: Optional[UTXOManager] = None) -> Tuple[UTXOManager, Dict]:
+        """
+        Rebuild the index and the UTXO set from the block files alone.
+        Blocks are replayed in file order, each becoming the tip as it did
+        when it was stored. A block that fails validation, or whose parent was
+        never stored, is indexed but left off the chain.
+        Returns the UTXO set and a report with throughput figures.
+        """
+        utxo = utxo_manager if utxo_manager is not None else UTXOManager()
+        if self._writer is not None:
+            self.flush()
+            self._writer.close()
+            self._writer = None
+        self.db.execute("DELETE FROM blocks")
+        self.db.execute("DELETE FROM chain")
+        self.db.execute("DELETE FROM txs")
+        self.db.execute("DELETE FROM files")
+        self.tip_hash = None
+
+        started = time.perf_counter()
+        # replay on a view and flush once: the commitment is then updated for
+        # the final set only, not for every output that was created and spent
+        chain_state = UTXOView(utxo)
+        report = {"blocks": 0, "connected": 0, "skipped": 0, "reorgs": 0,
+                  "transactions": 0, "bytes": 0}
+        files: Dict[int, Tuple[int, int]] = {}
+        for file_no, offset, length, payload in self.scan():
+            lines = payload.decode().split("\n")[:-1]
+            block = _parse_lines(lines)
+            tx_spans = _tx_spans(lines)
+            report["blocks"] += 1
+            report["transactions"] += len(block.transactions)
+            report["bytes"] += length
+            _, count = files.get(file_no, (0, 0))
+            files[file_no] = (offset + length, count + 1)
+
+            self._index_block(block.block_hash, block.height, block.prev_hash, file_no, offset,
+                              length, [tx.tx_id for tx in block.transactions], tx_spans,
+                              on_chain=False)
+            if block.prev_hash == self.tip_hash:
+                connected = check_block(block, chain_state)[0]
+                if connected:
+                    chain_state.apply_changes(block_changes(block))
+                    self._set_chain([(block.height, block.block_hash)])
+            else:
+                connected = self._reorganize(chain_state, block)
+                report["reorgs"] += connected
+            report["connected" if connected else "skipped"] += 1
+
+        chain_state.flush()
+        self.db.executemany("INSERT INTO files VALUES (?, ?, ?)",
+                            [(file_no, size, count) for file_no, (size, count) in files.items()])
+        self.db.commit()
+        last = max(files) if files else 0
+        self.file_no, (self.pos, self.file_blocks) = last, files.get(last, (0, 0))
+
+        report["seconds"] = time.perf_counter() - started
+        report["mb_per_second"] = (report["bytes"] / 1e6 / report["seconds"]
+                                   if report["seconds"] > 0 else 0.0)
+        return utxo, report
+
+    def _reorganize(self, utxo, new_tip: Block) -> bool:
+        """
+        Switch the rebuilt chain to the branch ending in new_tip, on a UTXOView
+        so that a branch that does not validate leaves the set untouched.
+        """
+        branch = [new_tip]
+        fork = new_tip.prev_hash
+        while fork is not None:
+            parent = self.get_block(fork)
+            if parent is None:
+                return False
+            if self.get_block_hash(parent.height) == fork:
+                break
+            branch.append(parent)
+            fork = parent.prev_hash
+        branch.reverse()
+
+        view = UTXOView(utxo)
+        try:
+            tip_hash = self.tip_hash
+            while tip_hash != fork:
+                old = self.get_block(tip_hash)
+                view.apply_changes(undo_changes(old, old.spent_outputs))
+                tip_hash = old.prev_hash
+            for block in branch:
+                if not check_block(block, view)[0]:
+                    view.discard()
+                    return False
+                view.apply_changes(block_changes(block))
+        except ValueError:
+            view.discard()
+            return False
+        view.flush()
+        self._set_chain([(block.height, block.block_hash) for block in branch])
+        return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flat-file block storage")
+    parser.add_argument("--dir", default=os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "blocks"))
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("info", help="show chain height and files")
+    commands.add_parser("reindex", help="rebuild the index and UTXO set from the block files")
+    block_cmd = commands.add_parser("block", help="print a block by hash or height")
+    block_cmd.add_argument("id")
+    tx_cmd = commands.add_parser("tx", help="print a transaction by txid")
+    tx_cmd.add_argument("txid")
+    args = parser.parse_args()
+
+    with BlockStore(args.dir) as store:
+        if args.command == "info":
+            print(f"Height {store.height}, tip {store.tip_hash}")
+            for file_no, size, blocks in store.db.execute("SELECT * FROM files ORDER BY file"):
+                print(f"  blk{file_no:05d}.dat: {blocks} blocks, {size} bytes")
+        elif args.command == "reindex":
+            utxo, report = store.reindex()
+            print(f"Reindexed {report['blocks']} blocks ({report['transactions']} transactions, "
+                  f"{report['bytes'] / 1e6:.1f} MB) in {report['seconds']:.2f} s "
+                  f"({report['mb_per_second']:.1f} MB/s)")
+            print(f"Connected {report['connected']}, skipped {report['skipped']}; "
+                  f"height {store.height}, {utxo.coin_count} UTXOs, supply {utxo.total_supply:.8f}")
+            print(f"UTXO commitment: {utxo.get_commitment()}")
+        elif args.command == "block":
+            block = store.get_block_by_height(int(args.id)) if args.id.isdigit() \
+                else store.get_block(args.id)
+            if block is None:
+                print("Block not found")
+                return
+            print(f"Block {block.height} {block.block_hash}")
+            print(f"  prev {block.prev_hash}, miner {block.miner_address}, "
+                  f"fees {block.total_fees:.8f}")
+            for tx in block.transactions:
+                print(f"  {tx.tx_id}: {len(tx.inputs)} in, {len(tx.outputs)} out, fee {tx.fee:.8f}")
+        elif args.command == "tx":
+            found = store.get_transaction(args.txid)
+            if found is None:
+                print("Transaction not found")
+                return
+            tx, block_hash = found
+            print(f"{tx.tx_id} in block {block_hash}")
+            print(json.dumps(tx_to_dict(tx), indent=2))
+
+
+if __name__ == "__main__":
+    main()
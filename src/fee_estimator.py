@@ -0,0 +1,142 @@
+import json
+import math
+import os
+from typing import Dict, List, Optional, Tuple
+
+
+class FeeEstimator:
+    """
+    Fee rate estimator fed by confirmed transactions.
+
+    Each confirmed transaction is dropped into an exponentially spaced fee
+    rate bucket, together with the number of blocks it waited in the mempool.
+    All counts decay a little on every block so old data fades out.
+    Estimates are recomputed once per block, so lookups are a dict access.
+    """
+
+    MIN_RATE = 1.0          # sat/byte, lower edge of the first bucket
+    MAX_RATE = 10_000.0     # sat/byte, anything above goes in the last bucket
+    SPACING = 1.2           # each bucket is 20% wider than the last
+    MAX_TARGET = 24         # longest confirmation target tracked, in blocks
+    DECAY = 0.95            # per-block decay of all counts
+    SUCCESS_THRESHOLD = 0.85
+    MIN_SAMPLES = 1.0
+
+    def __init__(self):
+        self.num_buckets = int(math.log(self.MAX_RATE / self.MIN_RATE, self.SPACING)) + 2
+        # confirmed[w][b]: decayed count of txs in bucket b that confirmed after w blocks
+        self.confirmed = [[0.0] * self.num_buckets for _ in range(self.MAX_TARGET + 1)]
+        self.totals = [0.0] * self.num_buckets
+        self.rate_sums = [0.0] * self.num_buckets
+        self.estimates: Dict[int, float] = {}
+        self.best_height = 0
+
+    def _bucket(self, fee_rate: float) -> int:
+        if fee_rate < self.MIN_RATE:
+            return 0
+        b = int(math.log(fee_rate / self.MIN_RATE, self.SPACING)) + 1
+        return min(b, self.num_buckets - 1)
+
+    def process_transaction(self, fee_rate: float, blocks_waited: int):
+        """Record one confirmed transaction (O(1))"""
+        b = self._bucket(fee_rate)
+        w = min(max(blocks_waited, 1), self.MAX_TARGET)
+        self.confirmed[w][b] += 1
+        self.totals[b] += 1
+        self.rate_sums[b] += fee_rate
+
+    def process_block(self, height: int, confirmed_txs: List[Tuple[float, int]]):
+        """
+        Record a newly connected block.
+        Old data is decayed first, then each (fee_rate, blocks_waited) pair is
+        added and the cached estimates are refreshed.
+        """
+        self.best_height = height
+        for row in self.confirmed:
+            for b in range(self.num_buckets):
+                row[b] *= self.DECAY
+        for b in range(self.num_buckets):
+            self.totals[b] *= self.DECAY
+            self.rate_sums[b] *= self.DECAY
+        for fee_rate, blocks_waited in confirmed_txs:
+            self.process_transaction(fee_rate, blocks_waited)
+        self._recompute()
+
+    def _recompute(self):
+        # within[b]: txs in bucket b confirmed within the current target
+        within = [0.0] * self.num_buckets
+        estimates = {}
+        previous = None
+        for target in range(1, self.MAX_TARGET + 1):
+            row = self.confirmed[target]
+            for b in range(self.num_buckets):
+                within[b] += row[b]
+
+            # Walk down from the highest bucket, pooling buckets until a range
+            # holds MIN_SAMPLES. Each range is judged on its own success rate and
+            # then closed, so busy fast buckets cannot carry a slow one below them.
+            # Keep the lowest fee rate whose range still confirms reliably.
+            pooled_within = 0.0
+            pooled_total = 0.0
+            range_rate = None
+            best = None
+            for b in range(self.num_buckets - 1, -1, -1):
+                pooled_within += within[b]
+                pooled_total += self.totals[b]
+                if self.totals[b] > 0:
+                    range_rate = self.rate_sums[b] / self.totals[b]
+                if pooled_total < self.MIN_SAMPLES:
+                    continue
+                if pooled_within / pooled_total < self.SUCCESS_THRESHOLD:
+                    break
+                best = range_rate
+                pooled_within = 0.0
+                pooled_total = 0.0
+            # A rate good enough for a tighter target is good enough for this one
+            if best is None or (previous is not None and previous < best):
+                best = previous
+            if best is not None:
+                estimates[target] = best
+            previous = best
+        self.estimates = estimates
+
+    def estimate_fee(self, target: int) -> Optional[float]:
+        """Fee rate (sat/byte) to confirm within `target` blocks, or None if unknown"""
+        target = min(max(target, 1), self.MAX_TARGET)
+        return self.estimates.get(target)
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        state = {
+            "best_height": self.best_height,
+            "confirmed": self.confirmed,
+            "totals": self.totals,
+            "rate_sums": self.rate_sums,
+        }
+        with open(path, "w") as f:
+            json.dump(state, f)
+
+    @classmethod
+    def load(cls, path: str) -> "FeeEstimator":
+        estimator = cls()
+        if not os.path.exists(path):
+            return estimator
+        try:
+            with open(path) as f:
+                state = json.load(f)
+            best_height = int(state["best_height"])
+            confirmed = [[float(count) for count in row] for row in state["confirmed"]]
+            totals = [float(count) for count in state["totals"]]
+            rate_sums = [float(rate) for rate in state["rate_sums"]]
+        except (OSError, ValueError, KeyError, TypeError):
+            return estimator   # unreadable or missing fields, start fresh
+        if (len(totals) != estimator.num_buckets or len(rate_sums) != estimator.num_buckets
+                or len(confirmed) != cls.MAX_TARGET + 1
+                or any(len(row) != estimator.num_buckets for row in confirmed)):
+            return estimator   # bucket layout changed, start fresh
+        estimator.best_height = best_height
+        estimator.confirmed = confirmed
+        estimator.totals = totals
+        estimator.rate_sums = rate_sums
+        estimator._recompute()
+        return estimator
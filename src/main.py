@@ -1,10 +1,11 @@
 import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
-from utxo_manager import UTXOManager
 from mempool import Mempool
 from transaction import Transaction
 from block import mine_block
+from block_store import BlockStore
+from fee_estimator import FeeEstimator
 from test_scripts.test_scenarios import (
     run_all_tests, 
     test_1_basic_valid_transaction,
@@ -16,13 +17,40 @@ from test_scripts.test_scenarios import (
     test_7_zero_fee_transaction,
     test_8_race_attack_simulation,
     test_9_complete_mining_flow,
-    test_10_unconfirmed_chain
+    test_10_unconfirmed_chain,
+    test_11_block_reconciliation,
+    test_12_fee_estimation,
+    test_13_utxo_commitment,
+    test_14_network_simulation,
+    test_15_json_rpc_server,
+    test_16_sharded_utxo_manager,
+    test_17_utxo_view_layers,
+    test_18_soak_invariants,
+    test_19_block_store,
+    test_20_stale_mempool_transaction
 )
 
 
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+FEE_ESTIMATES_PATH = os.path.join(DATA_DIR, "fee_estimates.json")
+BLOCKS_DIR = os.path.join(DATA_DIR, "blocks")
+
+# (menu label, confirmation target in blocks, fallback sat/byte when there is no data yet)
+FEE_PRIORITIES = [
+    ("Low Priority", 6, 1.0),
+    ("Medium Priority", 3, 10.0),
+    ("High Priority", 1, 50.0),
+]
+
+
 def main():
-    utxo = UTXOManager()
-    mempool = Mempool()
+    block_store = BlockStore(BLOCKS_DIR)
+    # the UTXO set is the genesis block plus every stored block on the chain
+    utxo = block_store.load_utxo()
+    if block_store.height:
+        print(f"Loaded {block_store.height} blocks from {BLOCKS_DIR}")
+    fee_estimator = FeeEstimator.load(FEE_ESTIMATES_PATH)
+    mempool = Mempool(fee_estimator=fee_estimator)
 
     
     while True:
@@ -91,8 +119,14 @@ def main():
             print(f"Total fees collected: {total_fees:.8f} BTC")
             print(f"Miner {miner_name} receives {total_fees:.8f} BTC")
             
-            mine_block(miner_name, mempool, utxo)
-            print("Block mined successfully!")
+            block = mine_block(miner_name, mempool, utxo, prev_block=block_store.tip)
+            if block is None:
+                print("Block rejected")
+                continue
+            block_store.add_block(block)
+            block_store.flush()
+            fee_estimator.save(FEE_ESTIMATES_PATH)
+            print(f"Block {block.height} mined successfully!")
             print(f"Removed {selected_count} transactions from mempool.")
 
         elif ch == "5":
@@ -107,9 +141,19 @@ def main():
             print("8. Test 8: Race Attack Simulation")
             print("9. Test 9: Complete Mining Flow")
             print("10. Test 10: Unconfirmed Chain")
-            print("11. Run ALL tests")
+            print("11. Test 11: Block Reconciliation")
+            print("12. Test 12: Fee Estimation")
+            print("13. Test 13: UTXO Set Commitment")
+            print("14. Test 14: Network Simulation")
+            print("15. Test 15: JSON-RPC Server")
+            print("16. Test 16: Sharded UTXO Manager")
+            print("17. Test 17: UTXO View Layers")
+            print("18. Test 18: Soak Invariants")
+            print("19. Test 19: Flat-File Block Store")
+            print("20. Test 20: Stale Mempool Transaction")
+            print("21. Run ALL tests")
             
-            test_choice = input("Enter choice (1-11): ").strip()
+            test_choice = input("Enter choice (1-21): ").strip()
             
             test_functions = {
                 "1": test_1_basic_valid_transaction,
@@ -122,7 +166,17 @@ def main():
                 "8": test_8_race_attack_simulation,
                 "9": test_9_complete_mining_flow,
                 "10": test_10_unconfirmed_chain,
-                "11": run_all_tests
+                "11": test_11_block_reconciliation,
+                "12": test_12_fee_estimation,
+                "13": test_13_utxo_commitment,
+                "14": test_14_network_simulation,
+                "15": test_15_json_rpc_server,
+                "16": test_16_sharded_utxo_manager,
+                "17": test_17_utxo_view_layers,
+                "18": test_18_soak_invariants,
+                "19": test_19_block_store,
+                "20": test_20_stale_mempool_transaction,
+                "21": run_all_tests
             }
             
             if test_choice in test_functions:
@@ -131,6 +185,7 @@ def main():
                 print("Invalid test choice")
 
         elif ch == "6":
+            block_store.close()
             break
 
         else:
@@ -199,19 +254,19 @@ def create_transaction(utxo, mempool):
     
     # Show fee rate options (realistic Bitcoin fee rates)
     print("\nFee Rate Options:")
-    print("1. Low Priority (1 sat/byte) - May take hours")
-    print("2. Medium Priority (10 sat/byte) - ~30 minutes") 
-    print("3. High Priority (50 sat/byte) - ~10 minutes")
+    fee_rates = {}
+    for i, (label, target, fallback) in enumerate(FEE_PRIORITIES, 1):
+        estimate = mempool.fee_estimator.estimate_fee(target) if mempool.fee_estimator else None
+        if estimate is None:
+            fee_rates[str(i)] = fallback
+            print(f"{i}. {label} ({fallback:g} sat/byte) - no estimate yet")
+        else:
+            fee_rates[str(i)] = round(estimate, 1)
+            print(f"{i}. {label} ({estimate:.1f} sat/byte) - within ~{target} block(s)")
     print("4. Custom fee rate")
     
     fee_choice = input("Select fee option (1-4): ").strip()
     
-    fee_rates = {
-        "1": 1.0,    # Low priority
-        "2": 10.0,   # Medium priority  
-        "3": 50.0,   # High priority
-    }
-    
     if fee_choice in fee_rates:
         fee_rate = fee_rates[fee_choice]
     elif fee_choice == "4":
@@ -224,8 +279,8 @@ def create_transaction(utxo, mempool):
             print("Invalid fee rate")
             return
     else:
-        print("Invalid choice, using medium priority (10 sat/byte)")
-        fee_rate = 10.0
+        fee_rate = fee_rates["2"]
+        print(f"Invalid choice, using medium priority ({fee_rate:g} sat/byte)")
     
     # Calculate fee
     temp_tx.set_fee_rate(fee_rate)
@@ -1,15 +1,51 @@
 # mempool.py
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 from transaction import Transaction
 from validator import validate_transaction
 from utxo_manager import UTXOManager
+from utxo_view import UTXOView
 
 
 class Mempool:
-    def __init__(self, max_size: int = 50):
-        self.transactions: List[Transaction] = []
-        self.spent_utxos = set()   # (tx_id, index)
+    def __init__(self, max_size: int = 50, fee_estimator=None):
+        self._txs: Dict[str, Transaction] = {}   # tx_id -> tx, in arrival order
+        self.spent_utxos: Dict[tuple, str] = {}  # (tx_id, index) -> spending tx_id
+        self.entry_height: Dict[str, int] = {}   # tx_id -> height when it entered
+        # overlay of unconfirmed outputs and spends; built by view(), then kept up to date
+        self.unconfirmed: Optional[UTXOView] = None
         self.max_size = max_size
+        self.height = 0                          # blocks connected so far
+        self.fee_estimator = fee_estimator
+        if fee_estimator is not None:
+            self.height = fee_estimator.best_height
+
+    @property
+    def transactions(self) -> List[Transaction]:
+        return list(self._txs.values())
+
+    def __len__(self) -> int:
+        return len(self._txs)
+
+    def __contains__(self, tx_id: str) -> bool:
+        return tx_id in self._txs
+
+    def view(self, utxo_manager: UTXOManager) -> UTXOView:
+        """
+        The UTXO set as it would be with every mempool transaction applied.
+        The overlay is built from the pool on the first call (or when asked
+        about a different UTXO set) and updated on every insert and removal
+        after that. Returned as a fresh layer, so callers can build on it and
+        discard it.
+        """
+        if self.unconfirmed is None or self.unconfirmed.parent is not utxo_manager:
+            overlay = UTXOView(utxo_manager)
+            for tx in self._txs.values():
+                for idx, out in enumerate(tx.outputs):
+                    overlay.add_utxo(tx.tx_id, idx, out["amount"], out["address"])
+            for tx_id, index in self.spent_utxos:
+                overlay.remove_utxo(tx_id, index)
+            self.unconfirmed = overlay
+        return UTXOView(self.unconfirmed)
 
 #add transaction function
 
@@ -19,38 +55,124 @@ class Mempool:
         if not is_valid:
             return False, msg
 
-        if len(self.transactions) >= self.max_size:
-            removed = self.transactions.pop(0)
-            for inp in removed.inputs:
-                self.spent_utxos.discard((inp["prev_tx"], inp["index"]))
+        if len(self._txs) >= self.max_size:
+            self._evict_oldest()
+
+        self._insert(tx)
+        return True, "Transaction added to mempool"
 
+    def _insert(self, tx: Transaction):
         # track spent UTXOs
         for inp in tx.inputs:
-            self.spent_utxos.add((inp["prev_tx"], inp["index"]))
+            self.spent_utxos[(inp["prev_tx"], inp["index"])] = tx.tx_id
+        if self.unconfirmed is not None:
+            for inp in tx.inputs:
+                self.unconfirmed.remove_utxo(inp["prev_tx"], inp["index"])
+            for idx, out in enumerate(tx.outputs):
+                self.unconfirmed.add_utxo(tx.tx_id, idx, out["amount"], out["address"])
+        self._txs[tx.tx_id] = tx
+        self.entry_height[tx.tx_id] = self.height
 
-        self.transactions.append(tx)
-        return True, "Transaction added to mempool"
+    def _evict_oldest(self):
+        oldest_id = next(iter(self._txs))
+        self.remove_transaction(oldest_id)
 
 #remove transaction function
 
-    def remove_transaction(self, tx_id: str):
-        remaining = []
-        for tx in self.transactions:
-            if tx.tx_id == tx_id:
-                for inp in tx.inputs:
-                    self.spent_utxos.discard((inp["prev_tx"], inp["index"]))
-            else:
-                remaining.append(tx)
+    def remove_transaction(self, tx_id: str) -> bool:
+        tx = self._txs.pop(tx_id, None)
+        if tx is None:
+            return False
+        self.entry_height.pop(tx_id, None)
+        for inp in tx.inputs:
+            key = (inp["prev_tx"], inp["index"])
+            if self.spent_utxos.get(key) == tx_id:
+                del self.spent_utxos[key]
+                if self.unconfirmed is not None:
+                    self.unconfirmed.revert(*key)
+        if self.unconfirmed is not None:
+            for idx in range(len(tx.outputs)):
+                self.unconfirmed.revert(tx_id, idx)
+        return True
+
+#block connect / disconnect
+
+    def block_connected(self, block) -> Dict[str, int]:
+        """
+        Reconcile the mempool with a newly connected block.
+        Confirmed transactions are dropped, and any mempool transaction that
+        spends an outpoint the block just spent is evicted as a conflict.
+        Work is proportional to the block size, not the mempool size.
+        If a fee estimator is attached, it is fed each confirmed transaction.
+        """
+        confirmed = []
+        conflicts = 0
+        self.height += 1
+
+        for tx in block.transactions:
+            entered = self.entry_height.get(tx.tx_id)
+            if self.remove_transaction(tx.tx_id):
+                confirmed.append((tx.fee_rate, self.height - entered))
+
+        for tx in block.transactions:
+            for inp in tx.inputs:
+                spender = self.spent_utxos.get((inp["prev_tx"], inp["index"]))
+                if spender is not None and self.remove_transaction(spender):
+                    conflicts += 1
+
+        if self.fee_estimator is not None:
+            self.fee_estimator.process_block(self.height, confirmed)
+
+        return {"confirmed": len(confirmed), "conflicts": conflicts}
+
+    def block_disconnected(self, block) -> Dict[str, int]:
+        """
+        Return the transactions of a disconnected block to the mempool in one batch.
+        The UTXO set must already be rolled back. Mempool transactions spending
+        the block's outputs are evicted first, since those outputs are no longer
+        confirmed. Transactions whose inputs are now claimed by a mempool
+        transaction are skipped (first-seen rule), and the pool is trimmed back
+        to max_size afterwards.
+        """
+        restored = 0
+        skipped = 0
+        orphaned = 0
+        self.height -= 1
+
+        outputs = [(tx.tx_id, idx) for tx in block.transactions for idx in range(len(tx.outputs))]
+        if block.coinbase_id is not None:
+            outputs.append((block.coinbase_id, 0))
+        for key in outputs:
+            spender = self.spent_utxos.get(key)
+            if spender is not None and self.remove_transaction(spender):
+                orphaned += 1
+
+        for tx in block.transactions:
+            if tx.tx_id in self._txs or any(
+                (inp["prev_tx"], inp["index"]) in self.spent_utxos for inp in tx.inputs
+            ):
+                skipped += 1
+                continue
+            self._insert(tx)
+            restored += 1
+
+        evicted = 0
+        while len(self._txs) > self.max_size:
+            self._evict_oldest()
+            evicted += 1
+
+        return {"restored": restored, "skipped": skipped, "orphaned": orphaned, "evicted": evicted}
 
-        self.transactions = remaining
 #get top transactions function
     def get_top_transactions(self, n: int) -> List[Transaction]:
         # sorting according to fees, high to low
         def fee(tx: Transaction):
             return tx.fee
 
-        return sorted(self.transactions, key=fee, reverse=True)[:n]
+        return sorted(self._txs.values(), key=fee, reverse=True)[:n]
 
     def clear(self):
-        self.transactions.clear()
+        self._txs.clear()
         self.spent_utxos.clear()
+        self.entry_height.clear()
+        self.unconfirmed = None
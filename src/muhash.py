@@ -0,0 +1,50 @@
+import hashlib
+
+# 2^3072 - 1103717, the largest 3072-bit safe prime (same modulus as Bitcoin Core's MuHash3072)
+MODULUS = 2 ** 3072 - 1103717
+ELEMENT_BYTES = 384
+
+
+def _to_field(data: bytes) -> int:
+    """Hash arbitrary bytes to a nonzero element of the field"""
+    n = int.from_bytes(hashlib.shake_256(data).digest(ELEMENT_BYTES), "little")
+    n %= MODULUS
+    return n or 1
+
+
+class MuHash:
+    """
+    Rolling hash of a multiset.
+
+    The hash is the product of all element hashes modulo a large prime, so it
+    does not depend on insertion order. Numerator and denominator are kept
+    apart so that add and remove are both a single modular multiplication;
+    the inverse is only taken when a digest is requested.
+    """
+
+    def __init__(self):
+        self.numerator = 1
+        self.denominator = 1
+
+    def add(self, data: bytes):
+        self.numerator = (self.numerator * _to_field(data)) % MODULUS
+
+    def remove(self, data: bytes):
+        self.denominator = (self.denominator * _to_field(data)) % MODULUS
+
+    def combine(self, other: "MuHash"):
+        """Fold another set's hash into this one (set union)"""
+        self.numerator = (self.numerator * other.numerator) % MODULUS
+        self.denominator = (self.denominator * other.denominator) % MODULUS
+
+    def copy(self) -> "MuHash":
+        clone = MuHash()
+        clone.numerator = self.numerator
+        clone.denominator = self.denominator
+        return clone
+
+    def digest(self) -> str:
+        value = (self.numerator * pow(self.denominator, -1, MODULUS)) % MODULUS
+        # Normalise so the next digest() call does not redo the inversion
+        self.numerator, self.denominator = value, 1
+        return hashlib.sha256(value.to_bytes(ELEMENT_BYTES, "little")).hexdigest()
@@ -0,0 +1,685 @@
+"""
+Discrete-event network simulator.
+
+Nodes exchange transactions and blocks over a simulated topology. Nothing
+sleeps and nothing touches a socket: every message is an event on a heapq
+ordered by simulated time, so hours of traffic between thousands of nodes
+run as fast as the events can be processed.
+
+Transactions and blocks are shared objects. The same Transaction instance
+is relayed to every node, so memory grows with the number of distinct
+transactions, not with transactions x nodes.
+"""
+import argparse
+import bisect
+import heapq
+import random
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from block import Block, block_changes, check_block, connect_block, mine_block, undo_changes
+from mempool import Mempool
+from transaction import Transaction
+from utxo_manager import UTXOManager
+from utxo_view import UTXOView
+
+# event kinds
+TX_ARRIVE = 0
+BLOCK_ARRIVE = 1
+BLOCK_FOUND = 2
+TX_GENERATE = 3
+ATTACK = 4
+BLOCK_REQUEST = 5
+
+NO_SENDER = -1
+
+# blocks on top of a tx's block before its relay state is dropped
+FORGET_DEPTH = 6
+
+
+class Topology:
+    def __init__(self, num_nodes: int):
+        self.num_nodes = num_nodes
+        # node -> [(peer, latency in seconds, bandwidth in bytes/second)]
+        self.peers: List[List[Tuple[int, float, float]]] = [[] for _ in range(num_nodes)]
+        self.partitions: List[Tuple[float, float, Set[int]]] = []
+
+    def connect(self, a: int, b: int, latency: float, bandwidth: float):
+        self.peers[a].append((b, latency, bandwidth))
+        self.peers[b].append((a, latency, bandwidth))
+
+    def add_partition(self, start: float, end: float, group: Set[int]):
+        """Cut every link between `group` and the rest of the network during [start, end)"""
+        self.partitions.append((start, end, set(group)))
+
+    def is_cut(self, a: int, b: int, now: float) -> bool:
+        for start, end, group in self.partitions:
+            if start <= now < end and (a in group) != (b in group):
+                return True
+        return False
+
+    @classmethod
+    def random_graph(cls, num_nodes: int, degree: int = 8,
+                     latency: Tuple[float, float] = (0.02, 0.3),
+                     bandwidth: Tuple[float, float] = (1e5, 1e7),
+                     seed: Optional[int] = None) -> "Topology":
+        """
+        Random graph with roughly `degree` peers per node.
+        A ring is laid down first so the graph is always connected.
+        """
+        rng = random.Random(seed)
+        topo = cls(num_nodes)
+        edges = set()
+
+        def add(a, b):
+            if a == b or (min(a, b), max(a, b)) in edges:
+                return
+            edges.add((min(a, b), max(a, b)))
+            topo.connect(a, b, rng.uniform(*latency), rng.uniform(*bandwidth))
+
+        for a in range(num_nodes):
+            add(a, (a + 1) % num_nodes)
+        target = num_nodes * degree // 2
+        attempts = 0
+        while len(edges) < target and attempts < target * 10:
+            add(rng.randrange(num_nodes), rng.randrange(num_nodes))
+            attempts += 1
+        return topo
+
+
+class SimNode:
+    def __init__(self, node_id: int, utxo: UTXOManager, strategy: "HonestStrategy",
+                 hashrate: float = 0.0, mempool_size: int = 5000):
+        self.node_id = node_id
+        self.address = f"node{node_id}"
+        self.utxo = utxo
+        self.mempool = Mempool(max_size=mempool_size)
+        self.strategy = strategy
+        self.hashrate = hashrate
+        self.tip: Optional[Block] = None
+        self.blocks: Dict[str, Block] = {}          # every block seen, by hash
+        self.undo: Dict[str, list] = {}             # spent outputs of active chain blocks
+        self.orphans: Dict[str, List[Block]] = {}   # prev_hash -> blocks waiting for it
+        self.invalid: Set[str] = set()
+        self.private: List[Block] = []              # withheld blocks (Byzantine miners)
+        self.metrics = {
+            "txs_received": 0,
+            "txs_accepted": 0,
+            "txs_rejected": 0,
+            "double_spends_rejected": 0,
+            "blocks_received": 0,
+            "blocks_mined": 0,
+            "blocks_rejected": 0,
+            "reorgs": 0,
+            "max_reorg_depth": 0,
+            "bytes_sent": 0,
+            "bytes_received": 0,
+            "messages_dropped": 0,
+        }
+
+    @property
+    def height(self) -> int:
+        return self.tip.height if self.tip is not None else 0
+
+
+class HonestStrategy:
+    """Validate everything, relay everything that is valid, mine on the best tip"""
+    name = "honest"
+
+    def on_transaction(self, sim: "NetworkSimulator", node: SimNode, tx: Transaction, sender: int):
+        if sim.accept_transaction(node, tx):
+            sim.relay(node, TX_ARRIVE, tx, tx.size_bytes, exclude=sender)
+
+    def on_block(self, sim: "NetworkSimulator", node: SimNode, block: Block, sender: int):
+        for attached in sim.accept_block(node, block, sender):
+            sim.relay(node, BLOCK_ARRIVE, attached, attached.size_bytes, exclude=sender)
+
+    def on_block_mined(self, sim: "NetworkSimulator", node: SimNode, block: Block):
+        sim.relay(node, BLOCK_ARRIVE, block, block.size_bytes)
+
+    def on_attack(self, sim: "NetworkSimulator", node: SimNode):
+        pass
+
+
+class SilentStrategy(HonestStrategy):
+    """Byzantine: accepts data but never relays it (a black hole for its peers)"""
+    name = "silent"
+
+    def on_transaction(self, sim, node, tx, sender):
+        sim.accept_transaction(node, tx)
+
+    def on_block(self, sim, node, block, sender):
+        sim.accept_block(node, block, sender)
+
+
+class DoubleSpendStrategy(HonestStrategy):
+    """
+    Byzantine: race attack. Spends one coin twice, sending the payment to a
+    merchant to half of its peers and a payment back to itself to the other half.
+    """
+    name = "double_spend"
+
+    def on_attack(self, sim, node):
+        coin = sim.take_coin()
+        if coin is None:
+            return
+        prev_tx, index, amount, owner = coin
+        inputs = [{"prev_tx": prev_tx, "index": index, "owner": owner}]
+        fee = 226 * 10 / 100_000_000
+        if amount <= fee:
+            return
+        honest = Transaction(sim.next_tx_id(), inputs,
+                             [{"amount": amount - fee, "address": "merchant"}])
+        cheat = Transaction(sim.next_tx_id(), inputs,
+                            [{"amount": amount - fee, "address": node.address}])
+        honest.set_fee_rate(fee * 100_000_000 / honest.size_bytes)
+        cheat.set_fee_rate(fee * 100_000_000 / cheat.size_bytes)
+        sim.attacks.append((node.node_id, honest, cheat))
+
+        peers = sim.topology.peers[node.node_id]
+        half = len(peers) // 2
+        for peer, latency, bandwidth in peers[:half]:
+            sim.send(node, peer, latency, bandwidth, TX_ARRIVE, honest, honest.size_bytes)
+        for peer, latency, bandwidth in peers[half:]:
+            sim.send(node, peer, latency, bandwidth, TX_ARRIVE, cheat, cheat.size_bytes)
+
+
+class WithholdingStrategy(HonestStrategy):
+    """
+    Byzantine: selfish miner. Keeps its blocks private and only publishes them
+    once the honest chain catches up to the first withheld block.
+    """
+    name = "withhold"
+
+    def on_block_mined(self, sim, node, block):
+        node.private.append(block)
+
+    def on_block(self, sim, node, block, sender):
+        attached = sim.accept_block(node, block, sender)
+        if node.private and any(b.height >= node.private[0].height for b in attached):
+            for withheld in node.private:
+                sim.relay(node, BLOCK_ARRIVE, withheld, withheld.size_bytes)
+            node.private = []
+
+
+STRATEGIES = {
+    cls.name: cls for cls in (HonestStrategy, SilentStrategy, DoubleSpendStrategy, WithholdingStrategy)
+}
+
+
+class NetworkSimulator:
+    def __init__(self, topology: Topology, strategies: Optional[Dict[int, str]] = None,
+                 miners: Optional[Dict[int, float]] = None, block_interval: float = 600.0,
+                 tx_rate: float = 1.0, attack_rate: float = 1 / 600.0,
+                 funding_coins: int = 1000, txs_per_block: int = 500,
+                 mempool_size: int = 5000, seed: Optional[int] = None):
+        """
+        strategies: node id -> strategy name for Byzantine nodes (others are honest)
+        miners: node id -> share of hashrate; defaults to every node mining equally
+        tx_rate: honest transactions generated per simulated second
+        attack_rate: attacks per simulated second for each double-spending node
+        """
+        self.topology = topology
+        self.rng = random.Random(seed)
+        self.now = 0.0
+        self.block_interval = block_interval
+        self.tx_rate = tx_rate
+        self.attack_rate = attack_rate
+        self.txs_per_block = txs_per_block
+        self.events: list = []
+        self._seq = 0
+        self._tx_counter = 0
+        self.events_processed = 0
+        self.attacks: List[Tuple[int, Transaction, Transaction]] = []
+
+        # Every node starts from the same funded UTXO set, copied cheaply
+        template = UTXOManager()
+        self.coins: List[Tuple[str, int, float, str]] = []
+        for i in range(funding_coins):
+            owner = f"user{i % 100}"
+            template.add_utxo("funding", i, 1.0, owner)
+            self.coins.append(("funding", i, 1.0, owner))
+        self._pooled: Set[str] = set()
+
+        strategies = strategies or {}
+        miners = miners if miners is not None else {i: 1.0 for i in range(topology.num_nodes)}
+        self.nodes = [
+            SimNode(i, template.copy(), STRATEGIES[strategies.get(i, "honest")](),
+                    miners.get(i, 0.0), mempool_size)
+            for i in range(topology.num_nodes)
+        ]
+        self.honest_ids = [n.node_id for n in self.nodes if n.strategy.name == "honest"]
+        self._miner_ids = [n.node_id for n in self.nodes if n.hashrate > 0]
+        self._miner_cum = []
+        total = 0.0
+        for i in self._miner_ids:
+            total += self.nodes[i].hashrate
+            self._miner_cum.append(total)
+
+        # tx id -> bitmask of nodes that already have it (cheaper than a set per node)
+        self.tx_seen: Dict[str, int] = {}
+        # tx id -> bitmask of nodes the tx body has been sent to
+        self.tx_requested: Dict[str, int] = {}
+        self._everyone = (1 << topology.num_nodes) - 1
+        # (sender, receiver) -> time the link is busy until
+        self._link_busy: Dict[Tuple[int, int], float] = {}
+
+    # scheduling
+
+    def schedule(self, at: float, kind: int, node_id: int, sender: int = NO_SENDER, payload=None):
+        self._seq += 1
+        heapq.heappush(self.events, (at, self._seq, kind, node_id, sender, payload))
+
+    def next_tx_id(self) -> str:
+        self._tx_counter += 1
+        return f"sim_tx_{self._tx_counter}"
+
+    def send(self, src: SimNode, dst: int, latency: float, bandwidth: float,
+             kind: int, payload, size: int):
+        if kind == TX_ARRIVE:
+            # inv/getdata: a peer that has the tx, or is already fetching it
+            # from someone else, only receives the announcement
+            requested = self.tx_requested.get(payload.tx_id, 0)
+            if (requested | self.tx_seen.get(payload.tx_id, 0)) >> dst & 1:
+                return
+        if self.topology.partitions and self.topology.is_cut(src.node_id, dst, self.now):
+            # not marked as requested, so another peer can still deliver it later
+            src.metrics["messages_dropped"] += 1
+            return
+        if kind == TX_ARRIVE:
+            self.tx_requested[payload.tx_id] = requested | (1 << dst)
+        key = (src.node_id, dst)
+        start = max(self.now, self._link_busy.get(key, 0.0))
+        done = start + size / bandwidth
+        self._link_busy[key] = done
+        src.metrics["bytes_sent"] += size
+        self.schedule(done + latency, kind, dst, src.node_id, payload)
+
+    def relay(self, node: SimNode, kind: int, payload, size: int, exclude: int = NO_SENDER):
+        for peer, latency, bandwidth in self.topology.peers[node.node_id]:
+            if peer != exclude:
+                self.send(node, peer, latency, bandwidth, kind, payload, size)
+
+    # node actions
+
+    def accept_transaction(self, node: SimNode, tx: Transaction) -> bool:
+        """Offer a tx to a node's mempool; False if already seen or invalid"""
+        seen = self.tx_seen.get(tx.tx_id, 0)
+        bit = 1 << node.node_id
+        if seen & bit:
+            return False
+        self.tx_seen[tx.tx_id] = seen | bit
+
+        ok, msg = node.mempool.add_transaction(tx, node.utxo)
+        if ok:
+            node.metrics["txs_accepted"] += 1
+        else:
+            node.metrics["txs_rejected"] += 1
+            if "already spent in mempool" in msg:
+                node.metrics["double_spends_rejected"] += 1
+        return ok
+
+    def forget_transaction(self, tx_id: str):
+        """Drop a tx's relay state once no node can still need it"""
+        self.tx_seen.pop(tx_id, None)
+        self.tx_requested.pop(tx_id, None)
+
+    def accept_block(self, node: SimNode, block: Block, sender: int = NO_SENDER) -> List[Block]:
+        """
+        Store a block and switch to it if it makes a longer chain.
+        Missing parents are requested from the sender.
+        Returns the blocks newly attached to the node's block tree (the
+        block itself plus any orphans it unlocked), which are the ones to relay.
+        """
+        if block.block_hash in node.blocks or block.block_hash in node.invalid:
+            return []
+        if block.prev_hash is not None and block.prev_hash in node.invalid:
+            node.invalid.add(block.block_hash)
+            return []
+        node.blocks[block.block_hash] = block
+        if block.prev_hash is not None and block.prev_hash not in node.blocks:
+            waiting = node.orphans.setdefault(block.prev_hash, [])
+            waiting.append(block)
+            if len(waiting) == 1 and sender != NO_SENDER:
+                self.request_block(node, sender, block.prev_hash)
+            return []
+
+        attached = []
+        pending = [block]
+        best = node.tip
+        while pending:
+            b = pending.pop()
+            attached.append(b)
+            if best is None or b.height > best.height:
+                best = b
+            pending.extend(node.orphans.pop(b.block_hash, []))
+        if best is not node.tip:
+            self.reorganize(node, best)
+        return attached
+
+    def request_block(self, node: SimNode, peer_id: int, block_hash: str):
+        """getdata: ask a peer for a block; it arrives after a round trip"""
+        peer = self.nodes[peer_id]
+        block = peer.blocks.get(block_hash)
+        if block is None:
+            return
+        for other, latency, bandwidth in self.topology.peers[peer_id]:
+            if other == node.node_id:
+                if self.topology.partitions and self.topology.is_cut(peer_id, other, self.now):
+                    return
+                # the request itself takes one link latency to reach the peer
+                self.schedule(self.now + latency, BLOCK_REQUEST, peer_id, node.node_id, block)
+                return
+
+    def reorganize(self, node: SimNode, new_tip: Block):
+        """
+        Switch the node to the branch ending in new_tip.
+        A plain extension of the tip is connected directly. A real reorg is
+        first played out on a UTXOView (disconnect back to the fork, connect
+        the new branch) and only flushed into the node if the valid part of
+        the branch is longer than the current chain; otherwise the view is
+        discarded and the node never notices.
+        """
+        branch = []
+        b = new_tip
+        while b is not None and b.block_hash not in node.undo:
+            branch.append(b)
+            b = node.blocks.get(b.prev_hash) if b.prev_hash is not None else None
+        fork = b
+        branch.reverse()
+
+        if node.tip is fork and len(branch) == 1:
+            undo = []
+            ok, _ = connect_block(new_tip, node.mempool, node.utxo, undo)
+            if not ok:
+                node.metrics["blocks_rejected"] += 1
+                node.invalid.add(new_tip.block_hash)
+                node.blocks.pop(new_tip.block_hash, None)
+                return
+            node.undo[new_tip.block_hash] = undo
+            node.tip = new_tip
+            return
+
+        view = UTXOView(node.utxo)
+        disconnected = []
+        t = node.tip
+        while t is not fork:
+            view.apply_changes(undo_changes(t, node.undo[t.block_hash]))
+            disconnected.append(t)
+            t = node.blocks.get(t.prev_hash) if t.prev_hash is not None else None
+
+        connected = []
+        new_undo = {}
+        for i, blk in enumerate(branch):
+            ok, _ = check_block(blk, view)
+            if ok:
+                try:
+                    new_undo[blk.block_hash] = view.apply_changes(block_changes(blk))
+                except ValueError:
+                    ok = False
+            if not ok:
+                node.metrics["blocks_rejected"] += 1
+                for bad in branch[i:]:
+                    node.invalid.add(bad.block_hash)
+                    node.blocks.pop(bad.block_hash, None)
+                break
+            connected.append(blk)
+
+        if not connected or connected[-1].height <= node.height:
+            view.discard()
+            return
+
+        view.flush()
+        for t in disconnected:
+            del node.undo[t.block_hash]
+            node.mempool.block_disconnected(t)
+        for blk in connected:
+            node.undo[blk.block_hash] = new_undo[blk.block_hash]
+            node.mempool.block_connected(blk)
+        node.tip = connected[-1]
+        if disconnected:
+            node.metrics["reorgs"] += 1
+            node.metrics["max_reorg_depth"] = max(node.metrics["max_reorg_depth"], len(disconnected))
+
+    def take_coin(self) -> Optional[Tuple[str, int, float, str]]:
+        """Remove and return a random spendable coin from the workload's wallet pool"""
+        if not self.coins:
+            return None
+        i = self.rng.randrange(len(self.coins))
+        self.coins[i], self.coins[-1] = self.coins[-1], self.coins[i]
+        return self.coins.pop()
+
+    def _generate_transaction(self):
+        coin = self.take_coin()
+        if coin is None:
+            return
+        prev_tx, index, amount, owner = coin
+        fee_rate = self.rng.choice([1.0, 2.0, 5.0, 10.0, 20.0, 50.0]) * self.rng.uniform(0.8, 1.2)
+        recipient = f"user{self.rng.randrange(100)}"
+        pay = amount * self.rng.uniform(0.1, 0.9)
+        outputs = [{"amount": pay, "address": recipient}, {"amount": 0.0, "address": owner}]
+        tx = Transaction(self.next_tx_id(), [{"prev_tx": prev_tx, "index": index, "owner": owner}],
+                         outputs)
+        tx.set_fee_rate(fee_rate)
+        change = amount - pay - tx.fee
+        if change < 0:
+            return
+        outputs[1]["amount"] = change
+
+        origin = self.nodes[self.rng.choice(self.honest_ids)]
+        origin.strategy.on_transaction(self, origin, tx, NO_SENDER)
+
+    def _mine(self):
+        miner = self.nodes[self._miner_ids[bisect.bisect_left(
+            self._miner_cum, self.rng.uniform(0, self._miner_cum[-1]))]]
+        block = mine_block(miner.address, miner.mempool, miner.utxo,
+                           self.txs_per_block, prev_block=miner.tip, timestamp=self.now)
+        if block is None:
+            return
+        miner.blocks[block.block_hash] = block
+        miner.undo[block.block_hash] = block.spent_outputs
+        miner.tip = block
+        miner.metrics["blocks_mined"] += 1
+
+        # transactions buried FORGET_DEPTH blocks deep are long past relaying
+        buried = block
+        for _ in range(FORGET_DEPTH):
+            buried = miner.blocks.get(buried.prev_hash) if buried.prev_hash is not None else None
+            if buried is None:
+                break
+        if buried is not None:
+            for tx in buried.transactions:
+                self.forget_transaction(tx.tx_id)
+
+        # the workload can spend confirmed outputs from here on
+        for tx in block.transactions:
+            if tx.tx_id in self._pooled:
+                continue
+            self._pooled.add(tx.tx_id)
+            for idx, out in enumerate(tx.outputs):
+                if out["address"].startswith("user") and out["amount"] > 0:
+                    self.coins.append((tx.tx_id, idx, out["amount"], out["address"]))
+
+        miner.strategy.on_block_mined(self, miner, block)
+
+    # main loop
+
+    def run(self, duration: float) -> Dict:
+        """Simulate `duration` seconds of network time and return summary metrics"""
+        wall_start = time.time()
+        end = self.now + duration
+
+        if self.tx_rate > 0 and self.honest_ids:
+            self.schedule(self.now + self.rng.expovariate(self.tx_rate), TX_GENERATE, NO_SENDER)
+        if self._miner_ids:
+            self.schedule(self.now + self.rng.expovariate(1 / self.block_interval), BLOCK_FOUND, NO_SENDER)
+        for node in self.nodes:
+            if node.strategy.name == "double_spend" and self.attack_rate > 0:
+                self.schedule(self.now + self.rng.expovariate(self.attack_rate), ATTACK, node.node_id)
+
+        events = self.events
+        nodes = self.nodes
+        while events and events[0][0] < end:
+            at, _, kind, node_id, sender, payload = heapq.heappop(events)
+            self.now = at
+            self.events_processed += 1
+
+            if kind == TX_ARRIVE:
+                node = nodes[node_id]
+                node.metrics["txs_received"] += 1
+                node.metrics["bytes_received"] += payload.size_bytes
+                node.strategy.on_transaction(self, node, payload, sender)
+                # once every node has it, no copy can be in flight any more
+                if self.tx_seen.get(payload.tx_id) == self._everyone:
+                    self.forget_transaction(payload.tx_id)
+            elif kind == BLOCK_ARRIVE:
+                node = nodes[node_id]
+                node.metrics["blocks_received"] += 1
+                node.metrics["bytes_received"] += payload.size_bytes
+                node.strategy.on_block(self, node, payload, sender)
+            elif kind == BLOCK_REQUEST:
+                # node_id serves `payload` back to the requesting node
+                node = nodes[node_id]
+                for other, latency, bandwidth in self.topology.peers[node_id]:
+                    if other == sender:
+                        self.send(node, sender, latency, bandwidth, BLOCK_ARRIVE, payload,
+                                  payload.size_bytes)
+                        break
+            elif kind == TX_GENERATE:
+                self._generate_transaction()
+                self.schedule(at + self.rng.expovariate(self.tx_rate), TX_GENERATE, NO_SENDER)
+            elif kind == BLOCK_FOUND:
+                self._mine()
+                self.schedule(at + self.rng.expovariate(1 / self.block_interval), BLOCK_FOUND, NO_SENDER)
+            elif kind == ATTACK:
+                node = nodes[node_id]
+                node.strategy.on_attack(self, node)
+                self.schedule(at + self.rng.expovariate(self.attack_rate), ATTACK, node_id)
+
+        # drop the recurring events so a later run() starts them afresh
+        self.events = [e for e in events if e[2] in (TX_ARRIVE, BLOCK_ARRIVE, BLOCK_REQUEST)]
+        heapq.heapify(self.events)
+        self.now = end
+        return self.summary(time.time() - wall_start)
+
+    # metrics
+
+    def node_metrics(self) -> List[Dict]:
+        result = []
+        for node in self.nodes:
+            entry = {"node_id": node.node_id, "strategy": node.strategy.name,
+                     "height": node.height, "mempool_size": len(node.mempool.transactions)}
+            entry.update(node.metrics)
+            result.append(entry)
+        return result
+
+    def summary(self, wall_time: float = 0.0) -> Dict:
+        tips = {}
+        for node in self.nodes:
+            key = node.tip.block_hash if node.tip is not None else None
+            tips[key] = tips.get(key, 0) + 1
+        best_tip = max(tips, key=tips.get)
+
+        # Nodes on the same tip must have identical UTXO sets
+        commitments = {
+            node.utxo.get_commitment() for node in self.nodes
+            if (node.tip.block_hash if node.tip is not None else None) == best_tip
+        }
+
+        attacks = []
+        for attacker, honest, cheat in self.attacks:
+            attacks.append({
+                "attacker": attacker,
+                "honest_confirmed": sum(1 for n in self.nodes if n.utxo.exists(honest.tx_id, 0)),
+                "cheat_confirmed": sum(1 for n in self.nodes if n.utxo.exists(cheat.tx_id, 0)),
+                # nodes that confirmed both sides: an actual double-spend
+                "both_confirmed": sum(1 for n in self.nodes if n.utxo.exists(honest.tx_id, 0)
+                                      and n.utxo.exists(cheat.tx_id, 0)),
+            })
+
+        totals = {}
+        for node in self.nodes:
+            for k, v in node.metrics.items():
+                if k.startswith("max_"):
+                    totals[k] = max(totals.get(k, 0), v)
+                else:
+                    totals[k] = totals.get(k, 0) + v
+
+        return {
+            "sim_time": self.now,
+            "wall_time": wall_time,
+            "events": self.events_processed,
+            "nodes": len(self.nodes),
+            "transactions": self._tx_counter,
+            "distinct_tips": len(tips),
+            "nodes_on_best_tip": tips[best_tip],
+            "best_height": max(n.height for n in self.nodes),
+            "utxo_divergence": len(commitments) > 1,
+            "double_spend_attempts": len(attacks),
+            # one side of a race always confirms; only count the attacker's side here
+            "cheat_side_confirmed": sum(1 for a in attacks if a["cheat_confirmed"]),
+            "double_spends_confirmed": sum(1 for a in attacks if a["both_confirmed"]),
+            "attacks": attacks,
+            "totals": totals,
+        }
+
+
+def _parse_byzantine(spec: str, num_nodes: int, rng: random.Random) -> Dict[int, str]:
+    """"double_spend:5,withhold:1" -> {node id: strategy} for randomly chosen nodes"""
+    strategies = {}
+    free = list(range(num_nodes))
+    rng.shuffle(free)
+    for part in filter(None, spec.split(",")):
+        name, count = part.split(":")
+        if name not in STRATEGIES:
+            raise ValueError(f"Unknown strategy {name}")
+        for _ in range(int(count)):
+            strategies[free.pop()] = name
+    return strategies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Discrete-event Byzantine network simulation")
+    parser.add_argument("--nodes", type=int, default=1000)
+    parser.add_argument("--degree", type=int, default=8)
+    parser.add_argument("--hours", type=float, default=1.0)
+    parser.add_argument("--tx-rate", type=float, default=1.0, help="transactions per second")
+    parser.add_argument("--miners", type=int, default=20, help="number of mining nodes")
+    parser.add_argument("--block-interval", type=float, default=600.0)
+    parser.add_argument("--byzantine", default="", help="e.g. double_spend:5,withhold:1,silent:20")
+    parser.add_argument("--partition", default="",
+                        help="start,end,fraction in seconds/share of nodes, e.g. 600,1800,0.5")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    topology = Topology.random_graph(args.nodes, args.degree, seed=args.seed)
+    if args.partition:
+        start, end, fraction = (float(x) for x in args.partition.split(","))
+        topology.add_partition(start, end, set(range(int(args.nodes * fraction))))
+    strategies = _parse_byzantine(args.byzantine, args.nodes, rng)
+    miners = {i: 1.0 for i in rng.sample(range(args.nodes), min(args.miners, args.nodes))}
+    # Byzantine miners need hashrate to withhold anything
+    for node_id, name in strategies.items():
+        if name == "withhold":
+            miners[node_id] = 1.0
+
+    sim = NetworkSimulator(topology, strategies, miners, args.block_interval,
+                           args.tx_rate, seed=args.seed)
+    summary = sim.run(args.hours * 3600)
+
+    print(f"Simulated {summary['sim_time'] / 3600:.2f} h across {summary['nodes']} nodes "
+          f"in {summary['wall_time']:.1f} s ({summary['events']} events)")
+    print(f"Transactions generated: {summary['transactions']}")
+    print(f"Best height: {summary['best_height']}, distinct tips: {summary['distinct_tips']}, "
+          f"nodes on best tip: {summary['nodes_on_best_tip']}")
+    print(f"UTXO divergence on best tip: {summary['utxo_divergence']}")
+    print(f"Double-spend attempts: {summary['double_spend_attempts']}, "
+          f"attacker's side confirmed: {summary['cheat_side_confirmed']}, "
+          f"both sides confirmed on one node: {summary['double_spends_confirmed']}")
+    for k, v in summary["totals"].items():
+        print(f"  {k}: {v}")
+
+
+if __name__ == "__main__":
+    main()
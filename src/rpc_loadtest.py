@@ -0,0 +1,133 @@
+"""
+Load-test client for rpc_server.py.
+
+Opens many concurrent connections, pipelines requests on each and reports
+throughput and latency percentiles. With --server it starts an in-process
+server on a free port first, so it can be run on its own.
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List
+
+from rpc_server import RPCNode, RPCServer
+
+DEFAULT_MIX = ["getbalance", "listunspent", "getmempoolinfo", "getblocktemplate"]
+PARAMS = {
+    "getbalance": ["Alice"],
+    "listunspent": ["Bob"],
+    "getmempoolinfo": [],
+    "getblocktemplate": [],
+}
+
+
+async def _client(host: str, port: int, requests: int, batch: int, pipeline: int,
+                  methods: List[str], latencies: List[float], errors: List[int]):
+    reader, writer = await asyncio.open_connection(host, port, limit=16 * 1024 * 1024)
+    sent_at: asyncio.Queue = asyncio.Queue()
+    in_flight = asyncio.Semaphore(pipeline)
+    lines = (requests + batch - 1) // batch
+
+    async def receive():
+        for _ in range(lines):
+            line = await reader.readline()
+            started = await sent_at.get()
+            latencies.append(time.perf_counter() - started)
+            in_flight.release()
+            response = json.loads(line)
+            for r in (response if isinstance(response, list) else [response]):
+                if "error" in r:
+                    errors[0] += 1
+
+    receiver = asyncio.create_task(receive())
+    next_id = 0
+    for _ in range(lines):
+        calls = []
+        for _ in range(min(batch, requests - next_id)):
+            method = methods[next_id % len(methods)]
+            calls.append({"jsonrpc": "2.0", "id": next_id, "method": method,
+                          "params": PARAMS.get(method, [])})
+            next_id += 1
+        payload = calls if batch > 1 else calls[0]
+        await in_flight.acquire()
+        sent_at.put_nowait(time.perf_counter())
+        writer.write(json.dumps(payload).encode() + b"\n")
+        await writer.drain()
+    await receiver
+    writer.close()
+    await writer.wait_closed()
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def run_load(host: str, port: int, clients: int = 10, requests: int = 1000,
+                   batch: int = 1, pipeline: int = 16,
+                   methods: List[str] = None) -> Dict:
+    """Run `clients` connections each sending `requests` calls; returns the report"""
+    methods = methods or DEFAULT_MIX
+    latencies: List[float] = []
+    errors = [0]
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        _client(host, port, requests, batch, pipeline, methods, latencies, errors)
+        for _ in range(clients)
+    ))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    total = clients * requests
+    return {
+        "requests": total,
+        "errors": errors[0],
+        "seconds": elapsed,
+        "requests_per_second": total / elapsed if elapsed > 0 else 0.0,
+        # latency is per line, i.e. per batch when batching
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p95_ms": _percentile(latencies, 95) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+        "max_ms": (latencies[-1] if latencies else 0.0) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON-RPC load test")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18443)
+    parser.add_argument("--server", action="store_true", help="start an in-process server")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000, help="calls per client")
+    parser.add_argument("--batch", type=int, default=1, help="calls per JSON-RPC batch")
+    parser.add_argument("--pipeline", type=int, default=16, help="lines in flight per client")
+    parser.add_argument("--methods", default=",".join(DEFAULT_MIX))
+    args = parser.parse_args()
+
+    async def run():
+        server = None
+        port = args.port
+        if args.server:
+            server = RPCServer(RPCNode(), args.host, 0)
+            await server.start()
+            port = server.port
+        try:
+            return await run_load(args.host, port, args.clients, args.requests,
+                                  args.batch, args.pipeline, args.methods.split(","))
+        finally:
+            if server is not None:
+                await server.close()
+
+    report = asyncio.run(run())
+    per = "request" if args.batch == 1 else f"batch of up to {args.batch} calls"
+    print(f"{report['requests']} requests in {report['seconds']:.2f} s "
+          f"({report['requests_per_second']:.0f} req/s), {report['errors']} errors")
+    print(f"latency per {per}: p50 {report['p50_ms']:.2f} ms, p95 {report['p95_ms']:.2f} ms, "
+          f"p99 {report['p99_ms']:.2f} ms, max {report['max_ms']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+"""
+Local JSON-RPC 2.0 server for the simulator, over line-delimited TCP.
+
+Each line a client sends is one JSON-RPC request or a batch array, and each
+response is written back as one line. Clients may pipeline: many lines can be
+in flight on one connection, and responses come back in request order.
+
+All node state is touched from a single worker thread, so validation and
+mining never block the event loop and never run concurrently with each other.
+A batch is executed in one hop to that thread.
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from block import mine_block
+from block_store import BlockStore, tx_to_dict
+from mempool import Mempool
+from transaction import Transaction
+from utxo_manager import UTXOManager
+
+# JSON-RPC 2.0 error codes, plus bitcoind's codes for a rejected transaction
+# and for an unknown block or transaction
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+VERIFY_REJECTED = -26
+NOT_FOUND = -5
+
+MAX_LINE = 16 * 1024 * 1024   # largest request line (a big batch) accepted
+MAX_IN_FLIGHT = 256           # pipelined requests per connection before reading pauses
+
+
+class RPCError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class RPCNode:
+    """
+    The node behind the RPC interface: a UTXO set, a mempool and a chain tip.
+    With a BlockStore, mined blocks are written to disk and served from it,
+    and the UTXO set is rebuilt from the stored chain on startup; without
+    one they are only kept in memory.
+    """
+
+    def __init__(self, utxo_manager: Optional[UTXOManager] = None,
+                 mempool: Optional[Mempool] = None,
+                 block_store: Optional[BlockStore] = None):
+        self.block_store = block_store
+        if utxo_manager is None:
+            utxo_manager = block_store.load_utxo() if block_store is not None else UTXOManager()
+        self.utxo = utxo_manager
+        self.mempool = mempool if mempool is not None else Mempool(max_size=5000)
+        self.tip = block_store.tip if block_store is not None else None
+        self.blocks = {}
+
+    def sendrawtransaction(self, tx: Dict) -> str:
+        try:
+            transaction = Transaction(tx["tx_id"], tx["inputs"], tx["outputs"])
+        except (KeyError, TypeError):
+            raise RPCError(INVALID_PARAMS, "tx needs tx_id, inputs and outputs")
+        if "fee_rate" in tx:
+            transaction.set_fee_rate(float(tx["fee_rate"]))
+        success, msg = self.mempool.add_transaction(transaction, self.utxo)
+        if not success:
+            raise RPCError(VERIFY_REJECTED, msg)
+        return transaction.tx_id
+
+    def getbalance(self, address: str) -> float:
+        return self.utxo.get_balance(address)
+
+    def listunspent(self, address: str) -> List[Dict]:
+        return self.utxo.get_utxos_for_owner(address)
+
+    def getmempoolinfo(self) -> Dict:
+        txs = self.mempool.transactions
+        return {
+            "size": len(txs),
+            "bytes": sum(tx.size_bytes for tx in txs),
+            "total_fee": sum(tx.fee for tx in txs),
+            "max_size": self.mempool.max_size,
+        }
+
+    def getblocktemplate(self, max_txs: int = 5) -> Dict:
+        txs = self.mempool.get_top_transactions(max_txs)
+        return {
+            "height": (self.tip.height if self.tip is not None else 0) + 1,
+            "previousblockhash": self.tip.block_hash if self.tip is not None else None,
+            "transactions": [
+                {"tx_id": tx.tx_id, "fee": tx.fee, "fee_rate": tx.fee_rate,
+                 "size": tx.size_bytes} for tx in txs
+            ],
+            "total_fees": sum(tx.fee for tx in txs),
+        }
+
+    def generate(self, nblocks: int = 1, miner_address: str = "rpc_miner",
+                 max_txs: int = 5) -> List[str]:
+        hashes = []
+        for _ in range(nblocks):
+            block = mine_block(miner_address, self.mempool, self.utxo, max_txs,
+                               prev_block=self.tip)
+            if block is None:
+                break
+            if self.block_store is not None:
+                self.block_store.add_block(block)
+            else:
+                self.blocks[block.block_hash] = block
+            self.tip = block
+            hashes.append(block.block_hash)
+        if self.block_store is not None:
+            self.block_store.flush()
+        return hashes
+
+    def _get_block(self, block_hash: str):
+        if self.block_store is not None:
+            return self.block_store.get_block(block_hash)
+        return self.blocks.get(block_hash)
+
+    def getblockcount(self) -> int:
+        return self.tip.height if self.tip is not None else 0
+
+    def getblockhash(self, height: int) -> str:
+        if self.block_store is not None:
+            block_hash = self.block_store.get_block_hash(height)
+        else:
+            block = self.tip
+            while block is not None and block.height > height:
+                block = self.blocks.get(block.prev_hash)
+            block_hash = block.block_hash if block is not None and block.height == height else None
+        if block_hash is None:
+            raise RPCError(NOT_FOUND, "Block height out of range")
+        return block_hash
+
+    def getblock(self, blockhash: str) -> Dict:
+        block = self._get_block(blockhash)
+        if block is None:
+            raise RPCError(NOT_FOUND, "Block not found")
+        return {
+            "hash": block.block_hash,
+            "height": block.height,
+            "previousblockhash": block.prev_hash,
+            "time": block.timestamp,
+            "miner": block.miner_address,
+            "total_fees": block.total_fees,
+            "utxo_commitment": block.utxo_commitment,
+            "tx": [tx.tx_id for tx in block.transactions],
+        }
+
+    def getrawtransaction(self, txid: str) -> Dict:
+        found = None
+        if self.block_store is not None:
+            found = self.block_store.get_transaction(txid)
+        else:
+            for block in self.blocks.values():
+                for tx in block.transactions:
+                    if tx.tx_id == txid:
+                        found = tx, block.block_hash
+        if found is None:
+            raise RPCError(NOT_FOUND, "No such transaction in a stored block")
+        tx, block_hash = found
+        return dict(tx_to_dict(tx), blockhash=block_hash)
+
+
+RPC_METHODS = ("sendrawtransaction", "getbalance", "listunspent",
+               "getmempoolinfo", "getblocktemplate", "generate",
+               "getblockcount", "getblockhash", "getblock", "getrawtransaction")
+
+
+def _error(code: int, message: str, request_id=None) -> Dict:
+    return {"jsonrpc": "2.0", "error": {"code": code, "message": message}, "id": request_id}
+
+
+class RPCServer:
+    def __init__(self, node: RPCNode, host: str = "127.0.0.1", port: int = 18443):
+        self.node = node
+        self.host = host
+        self.port = port
+        # one worker: node state is only ever touched from this thread
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rpc-node")
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.requests_served = 0
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle_client, self.host, self.port,
+                                                 limit=MAX_LINE)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        self.executor.shutdown(wait=True)
+
+    # request handling (runs on the worker thread)
+
+    def _call(self, request) -> Optional[Dict]:
+        if not isinstance(request, dict) or request.get("jsonrpc") != "2.0" \
+                or not isinstance(request.get("method"), str):
+            return _error(INVALID_REQUEST, "Invalid request")
+        request_id = request.get("id")
+        is_notification = "id" not in request
+        method = request["method"]
+        params = request.get("params", [])
+
+        try:
+            if method not in RPC_METHODS:
+                raise RPCError(METHOD_NOT_FOUND, f"Method {method} not found")
+            func = getattr(self.node, method)
+            try:
+                if isinstance(params, list):
+                    bound = inspect.signature(func).bind(*params)
+                elif isinstance(params, dict):
+                    bound = inspect.signature(func).bind(**params)
+                else:
+                    raise TypeError("params must be an array or object")
+            except TypeError as e:
+                raise RPCError(INVALID_PARAMS, str(e))
+            result = func(*bound.args, **bound.kwargs)
+        except RPCError as e:
+            response = _error(e.code, e.message, request_id)
+        except Exception as e:
+            response = _error(INTERNAL_ERROR, str(e), request_id)
+        else:
+            response = {"jsonrpc": "2.0", "result": result, "id": request_id}
+
+        self.requests_served += 1
+        return None if is_notification else response
+
+    def _execute(self, line: bytes) -> Optional[str]:
+        try:
+            payload = json.loads(line)
+        except ValueError:
+            return json.dumps(_error(PARSE_ERROR, "Parse error"))
+
+        if isinstance(payload, list):
+            if not payload:
+                return json.dumps(_error(INVALID_REQUEST, "Empty batch"))
+            responses = [r for r in (self._call(req) for req in payload) if r is not None]
+            return json.dumps(responses) if responses else None
+
+        response = self._call(payload)
+        return json.dumps(response) if response is not None else None
+
+    # connection handling (runs on the event loop)
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        loop = asyncio.get_running_loop()
+        # futures in request order; the writer answers them in that order
+        pending: asyncio.Queue = asyncio.Queue(MAX_IN_FLIGHT)
+
+        async def write_responses():
+            connected = True
+            while True:
+                future = await pending.get()
+                if future is None:
+                    break
+                response = await future
+                if response is None or not connected:
+                    continue   # keep draining so the reader never blocks on a full queue
+                try:
+                    writer.write(response.encode() + b"\n")
+                    await writer.drain()
+                except ConnectionError:
+                    connected = False
+
+        writer_task = asyncio.create_task(write_responses())
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    too_large = loop.create_future()
+                    too_large.set_result(json.dumps(_error(INVALID_REQUEST, "Request too large")))
+                    await pending.put(too_large)
+                    break
+                except ConnectionError:
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                await pending.put(loop.run_in_executor(self.executor, self._execute, line))
+            await pending.put(None)
+            await writer_task
+        finally:
+            writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON-RPC server for the simulator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18443)
+    parser.add_argument("--datadir", default=None,
+                        help="store mined blocks under DATADIR/blocks (default: memory only)")
+    args = parser.parse_args()
+
+    store = BlockStore(os.path.join(args.datadir, "blocks")) if args.datadir else None
+    server = RPCServer(RPCNode(block_store=store), args.host, args.port)
+
+    async def run():
+        await server.start()
+        print(f"JSON-RPC listening on {server.host}:{server.port} (line-delimited TCP)")
+        async with server.server:
+            await server.server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if store is not None:
+            store.close()
+
+
+if __name__ == "__main__":
+    main()
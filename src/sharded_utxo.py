@@ -0,0 +1,216 @@
+"""
+UTXO set partitioned across worker processes.
+
+Outpoints are assigned to shards by a stable hash of (tx_id, index). Each
+shard process owns a plain UTXOManager for its slice of the set. The
+coordinator sends batched lookups to every shard at once and collects the
+answers, so a block's inputs cost one round trip rather than one per input.
+
+Blocks are applied with a two-phase commit: every shard first checks its
+part of the changes (prepare), and only if all of them agree are the
+changes applied (commit). A block that fails on any shard leaves every shard
+untouched.
+"""
+import multiprocessing
+import zlib
+from typing import Dict, List, Tuple
+
+from muhash import MuHash
+from utxo_manager import UTXOManager
+
+
+def _shard_worker(conn):
+    utxo = UTXOManager(genesis=False)
+    staged = None
+    while True:
+        cmd, arg = conn.recv()
+        if cmd == "get_amounts":
+            conn.send(utxo.get_amounts(arg))
+        elif cmd == "get_entry":
+            conn.send(utxo.get_entry(*arg))
+        elif cmd == "prepare":
+            ok, msg = utxo.check_changes(arg)
+            staged = arg if ok else None
+            conn.send((ok, msg))
+        elif cmd == "commit":
+            # already checked in prepare, and nothing else touches this shard in between
+            spent = utxo.apply_changes(staged) if staged else []
+            staged = None
+            conn.send(spent)
+        elif cmd == "abort":
+            staged = None
+            conn.send(True)
+        elif cmd == "balance":
+            conn.send(utxo.get_balance(arg))
+        elif cmd == "owner_utxos":
+            conn.send(utxo.get_utxos_for_owner(arg))
+        elif cmd == "state":
+            conn.send((utxo.muhash.numerator, utxo.muhash.denominator,
+                       utxo.total_supply, utxo.coin_count))
+        elif cmd == "items":
+            conn.send(list(utxo.utxo_set.items()))
+        elif cmd == "stop":
+            conn.send(True)
+            break
+    conn.close()
+
+
+class ShardedUTXOManager:
+    """
+    Drop-in replacement for UTXOManager backed by `num_shards` processes.
+    Single-outpoint calls (exists, get_amount, add_utxo, remove_utxo) still
+    work, but each is a round trip; block code uses the batched
+    get_amounts / check_changes / apply_changes path.
+    """
+
+    def __init__(self, num_shards: int = 4, genesis: bool = True):
+        self.num_shards = num_shards
+        self._conns = []
+        self._procs = []
+        for i in range(num_shards):
+            parent, child = multiprocessing.Pipe()
+            proc = multiprocessing.Process(target=_shard_worker, args=(child,),
+                                           name=f"utxo-shard-{i}", daemon=True)
+            proc.start()
+            child.close()
+            self._conns.append(parent)
+            self._procs.append(proc)
+        self.total_supply = 0.0
+        self.coin_count = 0
+        if genesis:
+            self._create_genesis_block()
+
+    def _create_genesis_block(self):
+        ops = [("add", "genesis", i, amount, owner) for i, (amount, owner) in enumerate(
+            [(50.0, "Alice"), (30.0, "Bob"), (20.0, "Charlie"), (10.0, "David"), (5.0, "Eve")])]
+        self.apply_changes(ops)
+
+    def shard_of(self, tx_id: str, index: int) -> int:
+        # crc32 rather than hash(): str hashes are salted per process
+        return zlib.crc32(f"{tx_id}:{index}".encode()) % self.num_shards
+
+    def _broadcast(self, cmd: str, args: List) -> List:
+        """Send one command to every shard, then collect all replies (shards work in parallel)"""
+        for conn, arg in zip(self._conns, args):
+            conn.send((cmd, arg))
+        return [conn.recv() for conn in self._conns]
+
+    def _split_ops(self, ops: List[tuple]) -> List[List[tuple]]:
+        # per-shard order is preserved, and all ops on one outpoint land on one shard
+        parts = [[] for _ in range(self.num_shards)]
+        for op in ops:
+            parts[self.shard_of(op[1], op[2])].append(op)
+        return parts
+
+    # batched interface
+
+    def get_amounts(self, keys: List[tuple]) -> Dict[tuple, float]:
+        parts = [[] for _ in range(self.num_shards)]
+        for key in keys:
+            parts[self.shard_of(*key)].append(key)
+        result = {}
+        for found in self._broadcast("get_amounts", parts):
+            result.update(found)
+        return result
+
+    def check_changes(self, ops: List[tuple]) -> Tuple[bool, str]:
+        """Prepare phase on its own: check every shard's part, then release them"""
+        replies = self._broadcast("prepare", self._split_ops(ops))
+        self._broadcast("abort", [None] * self.num_shards)
+        for ok, msg in replies:
+            if not ok:
+                return False, msg
+        return True, "Changes are valid"
+
+    def apply_changes(self, ops: List[tuple], memo: dict = None) -> List[tuple]:
+        """
+        Two-phase commit of ops across all shards.
+        Raises ValueError (with every shard unchanged) if any shard rejects its part.
+        Spent entries are returned in the order of the spend ops.
+        """
+        parts = self._split_ops(ops)
+        replies = self._broadcast("prepare", parts)
+        failed = [msg for ok, msg in replies if not ok]
+        if failed:
+            self._broadcast("abort", [None] * self.num_shards)
+            raise ValueError(failed[0])
+
+        spent_by_key = {}
+        for spent in self._broadcast("commit", [None] * self.num_shards):
+            for entry in spent:
+                spent_by_key[(entry[0], entry[1])] = entry
+        spent = [spent_by_key[(op[1], op[2])] for op in ops if op[0] == "spend"]
+
+        self.total_supply += sum(op[3] for op in ops if op[0] == "add") \
+            - sum(entry[2] for entry in spent)
+        self.coin_count += sum(1 for op in ops if op[0] == "add") - len(spent)
+        return spent
+
+    # UTXOManager-compatible interface
+
+    def add_utxo(self, tx_id: str, index: int, amount: float, owner: str):
+        if self.exists(tx_id, index):
+            self.remove_utxo(tx_id, index)
+        self.apply_changes([("add", tx_id, index, amount, owner)])
+
+    def remove_utxo(self, tx_id: str, index: int):
+        if self.exists(tx_id, index):
+            self.apply_changes([("spend", tx_id, index)])
+
+    def get_entry(self, tx_id: str, index: int):
+        conn = self._conns[self.shard_of(tx_id, index)]
+        conn.send(("get_entry", (tx_id, index)))
+        return conn.recv()
+
+    def exists(self, tx_id: str, index: int) -> bool:
+        return (tx_id, index) in self.get_amounts([(tx_id, index)])
+
+    def get_amount(self, tx_id: str, index: int) -> float:
+        key = (tx_id, index)
+        found = self.get_amounts([key])
+        if key not in found:
+            raise ValueError(f"UTXO {key} not found")
+        return found[key]
+
+    def get_balance(self, owner: str) -> float:
+        return sum(self._broadcast("balance", [owner] * self.num_shards))
+
+    def get_utxos_for_owner(self, owner: str) -> list:
+        utxos = []
+        for part in self._broadcast("owner_utxos", [owner] * self.num_shards):
+            utxos.extend(part)
+        return utxos
+
+    @property
+    def utxo_set(self) -> dict:
+        """Snapshot of the whole set gathered from every shard (for display)"""
+        merged = {}
+        for items in self._broadcast("items", [None] * self.num_shards):
+            merged.update(items)
+        return merged
+
+    def get_commitment(self) -> str:
+        # MuHash is a product, so the shards' hashes combine into the full set's hash
+        total = MuHash()
+        for numerator, denominator, _, _ in self._broadcast("state", [None] * self.num_shards):
+            part = MuHash()
+            part.numerator, part.denominator = numerator, denominator
+            total.combine(part)
+        return total.digest()
+
+    def close(self):
+        if not self._conns:
+            return
+        self._broadcast("stop", [None] * self.num_shards)
+        for proc in self._procs:
+            proc.join()
+        for conn in self._conns:
+            conn.close()
+        self._conns = []
+        self._procs = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,562 @@
+"""
+Soak runner: drive one node with random load for hours and check invariants.
+
+Every operation (a payment, a double-spend attempt, a mined block, a rival
+block that conflicts with the mempool, a reorg) is followed by checks that
+only look at what the operation touched, so they cost the same after an hour
+as after a second:
+
+- supply: the UTXO set's running total moves by exactly what the block's
+  changes add up to, and that is zero, since the coinbase collects exactly
+  the fees its transactions leave behind
+- mempool: the runner predicts the pool (contents, eviction order and
+  spent_utxos) from each operation on its own, and compares sizes and every
+  touched entry against the real one
+- balances: per-owner balances are kept as running deltas and must never
+  go negative
+- chain: after every connect or disconnect the tip's stored UTXO commitment
+  matches the set
+
+Every `audit_every` operations a full audit rescans the UTXO set and the
+mempool, cross-checks the running results, and samples traced memory to flag
+growth that the live data does not account for.
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from collections import defaultdict, deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+from block import Block, block_changes, connect_block, disconnect_block, mine_block, undo_changes
+from mempool import Mempool
+from transaction import Transaction
+from utxo_manager import UTXOManager
+
+SUPPLY_TOLERANCE = 1e-6
+MAX_VIOLATIONS = 100   # violations kept in full; later ones are only counted
+OWNERS = ["Alice", "Bob", "Charlie", "David", "Eve"] + [f"user{i}" for i in range(20)]
+MINERS = ["miner0", "miner1", "miner2"]
+FEE_RATES = [1.0, 2.0, 5.0, 10.0, 20.0, 50.0]
+
+
+class SoakRunner:
+    def __init__(self, seed: int = 1, mempool_size: int = 500, txs_per_block: int = 10,
+                 target_utxos: int = 2000, audit_every: int = 5000, max_reorg_depth: int = 3,
+                 track_memory: bool = True, leak_tolerance: float = 0.25,
+                 fail_fast: bool = False):
+        self.rng = random.Random(seed)
+        self.utxo = UTXOManager()
+        self.mempool = Mempool(max_size=mempool_size)
+        self.txs_per_block = txs_per_block
+        self.target_utxos = target_utxos
+        self.audit_every = audit_every
+        self.max_reorg_depth = max_reorg_depth
+        self.track_memory = track_memory
+        self.leak_tolerance = leak_tolerance
+        self.fail_fast = fail_fast
+
+        self.chain: List[Block] = []   # recent blocks, oldest first, kept for reorgs
+        self.genesis_commitment = self.utxo.get_commitment()
+        self.genesis_supply = self.utxo.total_supply
+
+        # expectations kept by the runner itself, updated from each operation
+        self.expected_supply = self.utxo.total_supply
+        self.expected_coins = self.utxo.coin_count
+        self.balances: Dict[str, float] = defaultdict(float)
+        for data in self.utxo.utxo_set.values():
+            self.balances[data["owner"]] += data["amount"]
+        self.shadow: Dict[str, Transaction] = {}    # predicted mempool, oldest first
+        self.shadow_spent: Dict[tuple, str] = {}    # predicted mempool.spent_utxos
+        self.shadow_outputs = 0
+
+        # workload state
+        self.coins: List[tuple] = list(self.utxo.utxo_set)   # spent entries are dropped lazily
+        self.coin_set = set(self.coins)
+        self.recent_spent = deque(maxlen=64)   # outpoints recently claimed by the mempool
+        self.clock = 0
+        self.next_id = 0
+
+        self.ops = 0
+        self.counts: Dict[str, int] = defaultdict(int)
+        self.checks = 0
+        self.audits = 0
+        self.violations: List[Tuple[int, str, str]] = []
+        self.violation_count = 0
+        self.violations_by_check: Dict[str, int] = defaultdict(int)
+        self.memory: List[Tuple[int, int, int]] = []   # (op, traced bytes, live objects)
+        self.memory_growth = 0
+        self.leak: Optional[Dict] = None
+        self._memory_baseline = None
+
+    # bookkeeping
+
+    def _check(self, ok: bool, name: str, message: str = ""):
+        self.checks += 1
+        if not ok:
+            self.violation_count += 1
+            self.violations_by_check[name] += 1
+            if len(self.violations) < MAX_VIOLATIONS:
+                self.violations.append((self.ops, name, message))
+
+    def _next_id(self, prefix: str) -> str:
+        self.next_id += 1
+        return f"{prefix}{self.next_id}"
+
+    def _add_coin(self, key: tuple):
+        if key not in self.coin_set:
+            self.coin_set.add(key)
+            self.coins.append(key)
+
+    def _shadow_add(self, tx: Transaction):
+        self.shadow[tx.tx_id] = tx
+        for inp in tx.inputs:
+            self.shadow_spent[(inp["prev_tx"], inp["index"])] = tx.tx_id
+        self.shadow_outputs += len(tx.outputs)
+
+    def _shadow_remove(self, tx_id: str) -> Transaction:
+        tx = self.shadow.pop(tx_id)
+        for inp in tx.inputs:
+            key = (inp["prev_tx"], inp["index"])
+            if self.shadow_spent.get(key) == tx_id:
+                del self.shadow_spent[key]
+        self.shadow_outputs -= len(tx.outputs)
+        return tx
+
+    @property
+    def height(self) -> int:
+        return self.mempool.height
+
+    # workload
+
+    def _take_coins(self, n: int) -> List[tuple]:
+        """Pick up to n confirmed outpoints that the mempool does not spend yet"""
+        picked = []
+        attempts = 0
+        while len(picked) < n and self.coins and attempts < 4 * n:
+            attempts += 1
+            i = self.rng.randrange(len(self.coins))
+            key = self.coins[i]
+            if not self.utxo.exists(*key):
+                self.coins[i] = self.coins[-1]
+                self.coins.pop()
+                self.coin_set.discard(key)
+            elif key not in self.shadow_spent and key not in picked:
+                picked.append(key)
+        return picked
+
+    def _build_tx(self, keys: List[tuple], outputs: int = 1,
+                  prefix: str = "tx") -> Optional[Transaction]:
+        entries = [self.utxo.get_entry(*key) for key in keys]
+        total = sum(entry["amount"] for entry in entries)
+        outs = [{"amount": 0.0, "address": self.rng.choice(OWNERS)} for _ in range(outputs)]
+        tx = Transaction(self._next_id(prefix),
+                         [{"prev_tx": tx_id, "index": index, "owner": entry["owner"]}
+                          for (tx_id, index), entry in zip(keys, entries)],
+                         outs)
+        tx.set_fee_rate(self.rng.choice(FEE_RATES))
+        spend = total - tx.fee
+        if spend < 0:
+            return None
+        if len(outs) == 2:
+            outs[0]["amount"] = spend * self.rng.uniform(0.2, 0.8)
+            outs[1]["amount"] = spend - outs[0]["amount"]
+        else:
+            outs[0]["amount"] = spend
+        return tx
+
+    def step(self):
+        r = self.rng.random()
+        if r < 0.85:
+            self._op_transaction()
+        elif r < 0.92:
+            self._op_double_spend()
+        elif r < 0.975:
+            self._op_mine()
+        elif r < 0.99:
+            self._op_rival_block()
+        else:
+            self._op_reorg()
+        self.ops += 1
+
+    def _op_transaction(self):
+        self.counts["transaction"] += 1
+        # split coins while the set is below its target size, merge them above it
+        growing = self.utxo.coin_count < self.target_utxos
+        keys = self._take_coins(self.rng.choice((1, 1, 2) if growing else (2, 3)))
+        tx = self._build_tx(keys, outputs=2 if growing else 1) if keys else None
+        if tx is not None:
+            self._submit(tx, expect_accept=True)
+
+    def _op_double_spend(self):
+        self.counts["double_spend"] += 1
+        if not self.recent_spent:
+            return
+        key = self.recent_spent[self.rng.randrange(len(self.recent_spent))]
+        if key not in self.shadow_spent or not self.utxo.exists(*key):
+            return
+        tx = self._build_tx([key], prefix="ds")
+        if tx is not None:
+            self._submit(tx, expect_accept=False)
+
+    def _submit(self, tx: Transaction, expect_accept: bool):
+        supply, coins = self.utxo.total_supply, self.utxo.coin_count
+        evict = next(iter(self.shadow)) if len(self.shadow) >= self.mempool.max_size else None
+
+        accepted, msg = self.mempool.add_transaction(tx, self.utxo)
+        self._check(accepted == expect_accept, "mempool.accept",
+                    f"{tx.tx_id} {'accepted' if accepted else 'rejected'}: {msg}")
+        touched = [tx]
+        if accepted:
+            if evict is not None:
+                touched.append(self._shadow_remove(evict))
+            self._shadow_add(tx)
+            self.recent_spent.extend((inp["prev_tx"], inp["index"]) for inp in tx.inputs)
+            self.counts["tx_accepted"] += 1
+        else:
+            self.counts["tx_rejected"] += 1
+
+        self._check(self.utxo.total_supply == supply and self.utxo.coin_count == coins,
+                    "utxo.untouched", f"mempool add of {tx.tx_id} changed the UTXO set")
+        self._check_mempool(touched)
+
+    def _op_mine(self):
+        self.counts["mine"] += 1
+        self.clock += 1
+        before = (self.utxo.total_supply, self.utxo.coin_count)
+        block = mine_block(self.rng.choice(MINERS), self.mempool, self.utxo, self.txs_per_block,
+                           prev_block=self.chain[-1] if self.chain else None,
+                           timestamp=float(self.clock))
+        if block is None:
+            return
+        for tx in block.transactions:
+            self._check(tx.tx_id in self.shadow, "block.from_mempool",
+                        f"block {block.height} mined {tx.tx_id}, which was not in the mempool")
+        self._after_connect(block, before)
+
+    def _op_rival_block(self):
+        """Connect a block that spends an outpoint a mempool transaction already spends"""
+        self.counts["rival_block"] += 1
+        candidates = [key for key in self.recent_spent
+                      if key in self.shadow_spent and self.utxo.exists(*key)]
+        if not candidates:
+            return
+        tx = self._build_tx([self.rng.choice(candidates)], prefix="rival")
+        if tx is None:
+            return
+        self.clock += 1
+        prev = self.chain[-1] if self.chain else None
+        height = self.height + 1
+        block = Block([tx], "rival", f"coinbase_rival_{height}_{self.clock}", tx.fee,
+                      prev_hash=prev.block_hash if prev is not None else None,
+                      height=height, timestamp=float(self.clock))
+        before = (self.utxo.total_supply, self.utxo.coin_count)
+        ok, msg = connect_block(block, self.mempool, self.utxo, block.spent_outputs)
+        self._check(ok, "block.rival", f"rival block {height} rejected: {msg}")
+        if ok:
+            block.utxo_commitment = self.utxo.get_commitment()
+            self._after_connect(block, before)
+
+    def _after_connect(self, block: Block, before: Tuple[float, int]):
+        self.chain.append(block)
+        if len(self.chain) > self.max_reorg_depth + 1:
+            self.chain.pop(0)
+        self.counts["blocks_connected"] += 1
+
+        adds = [op for op in block_changes(block) if op[0] == "add"]
+        self._check_utxo_delta(block, before, block.spent_outputs, adds)
+        for op in adds:
+            self._add_coin((op[1], op[2]))
+
+        # predicted mempool: confirmed transactions leave, then anything conflicting with them
+        touched = []
+        for tx in block.transactions:
+            if tx.tx_id in self.shadow:
+                touched.append(self._shadow_remove(tx.tx_id))
+        for tx in block.transactions:
+            for inp in tx.inputs:
+                spender = self.shadow_spent.get((inp["prev_tx"], inp["index"]))
+                if spender is not None:
+                    touched.append(self._shadow_remove(spender))
+                    self.counts["conflicts_evicted"] += 1
+        self._check_mempool(touched)
+        for tx in block.transactions:
+            for inp in tx.inputs:
+                key = (inp["prev_tx"], inp["index"])
+                self._check(key not in self.mempool.spent_utxos, "mempool.conflict",
+                            f"{key} is spent by block {block.height} and still by the mempool")
+
+    def _op_reorg(self):
+        """Disconnect a few blocks; their transactions go back to the mempool"""
+        self.counts["reorg"] += 1
+        if len(self.chain) < 2:
+            return
+        depth = self.rng.randint(1, min(self.max_reorg_depth, len(self.chain) - 1))
+        for _ in range(depth):
+            block = self.chain.pop()
+            ops = undo_changes(block, block.spent_outputs)
+            spent = []
+            for op in ops:
+                if op[0] == "spend":
+                    entry = self.utxo.get_entry(op[1], op[2])
+                    self._check(entry is not None, "undo.missing",
+                                f"block {block.height} output {op[1]}:{op[2]} is gone")
+                    if entry is not None:
+                        spent.append((op[1], op[2], entry["amount"], entry["owner"]))
+            adds = [op for op in ops if op[0] == "add"]
+            before = (self.utxo.total_supply, self.utxo.coin_count)
+
+            # predicted mempool: spenders of the block's outputs go (no unconfirmed chains),
+            # then the block's transactions come back unless their inputs are claimed
+            touched = []
+            outputs = [(tx.tx_id, idx) for tx in block.transactions for idx in range(len(tx.outputs))]
+            if block.coinbase_id is not None:
+                outputs.append((block.coinbase_id, 0))
+            for key in outputs:
+                spender = self.shadow_spent.get(key)
+                if spender is not None:
+                    touched.append(self._shadow_remove(spender))
+            for tx in block.transactions:
+                if tx.tx_id not in self.shadow and not any(
+                        (inp["prev_tx"], inp["index"]) in self.shadow_spent for inp in tx.inputs):
+                    self._shadow_add(tx)
+                    touched.append(tx)
+            while len(self.shadow) > self.mempool.max_size:
+                touched.append(self._shadow_remove(next(iter(self.shadow))))
+
+            disconnect_block(block, self.mempool, self.utxo, block.spent_outputs)
+            self.counts["blocks_disconnected"] += 1
+            self._check_utxo_delta(block, before, spent, adds)
+            for op in adds:
+                self._add_coin((op[1], op[2]))
+            self._check_mempool(touched)
+
+    # incremental checks
+
+    def _check_utxo_delta(self, block: Block, before: Tuple[float, int],
+                          spent: List[tuple], adds: List[tuple]):
+        """Check one block's effect on the UTXO set from its own changes only"""
+        supply_before, coins_before = before
+        delta = sum(op[3] for op in adds) - sum(entry[2] for entry in spent)
+        self._check(abs(delta) <= SUPPLY_TOLERANCE, "supply.conserved",
+                    f"block {block.height} moved supply by {delta:.10f} "
+                    f"(coinbase {block.total_fees:.10f})")
+        self._check(abs(self.utxo.total_supply - (supply_before + delta)) <= SUPPLY_TOLERANCE,
+                    "supply.running", f"running supply {self.utxo.total_supply:.10f}, "
+                    f"expected {supply_before + delta:.10f}")
+        self.expected_supply += delta
+        self.expected_coins += len(adds) - len(spent)
+        self._check(self.utxo.coin_count == coins_before + len(adds) - len(spent)
+                    and self.utxo.coin_count == self.expected_coins, "utxo.coin_count",
+                    f"{self.utxo.coin_count} coins, expected {self.expected_coins}")
+
+        touched = set()
+        for tx_id, index, amount, owner in spent:
+            self.balances[owner] -= amount
+            touched.add(owner)
+        for _, tx_id, index, amount, owner in adds:
+            self.balances[owner] += amount
+            touched.add(owner)
+            entry = self.utxo.get_entry(tx_id, index)
+            self._check(entry is not None and entry["amount"] == amount and entry["owner"] == owner,
+                        "utxo.entry", f"{tx_id}:{index} is {entry}, expected {amount} to {owner}")
+        for owner in touched:
+            self._check(self.balances[owner] >= -SUPPLY_TOLERANCE, "balance.negative",
+                        f"{owner} has {self.balances[owner]:.10f}")
+
+        tip = self.chain[-1] if self.chain else None
+        expected = tip.utxo_commitment if tip is not None else self.genesis_commitment
+        self._check(self.utxo.get_commitment() == expected, "utxo.commitment",
+                    f"UTXO set does not match the commitment of block {self.height}")
+
+    def _check_mempool(self, touched: List[Transaction]):
+        """Compare the mempool with the prediction: sizes, plus every touched transaction"""
+        mempool = self.mempool
+        self._check(len(mempool) == len(self.shadow), "mempool.size",
+                    f"{len(mempool)} transactions, expected {len(self.shadow)}")
+        self._check(len(mempool.spent_utxos) == len(self.shadow_spent), "mempool.spent_utxos",
+                    f"{len(mempool.spent_utxos)} spent outpoints, expected {len(self.shadow_spent)}")
+        if mempool.unconfirmed is not None:
+            expected = len(self.shadow_spent) + self.shadow_outputs
+            self._check(len(mempool.unconfirmed) == expected, "mempool.overlay",
+                        f"overlay holds {len(mempool.unconfirmed)} entries, expected {expected}")
+        for tx in touched:
+            keys = [(inp["prev_tx"], inp["index"]) for inp in tx.inputs]
+            if tx.tx_id in self.shadow:
+                self._check(tx.tx_id in mempool, "mempool.missing", f"{tx.tx_id} is not in the mempool")
+                for key in keys:
+                    self._check(mempool.spent_utxos.get(key) == tx.tx_id and self.utxo.exists(*key),
+                                "mempool.input", f"{tx.tx_id} input {key} is not tracked or not confirmed")
+            else:
+                self._check(tx.tx_id not in mempool, "mempool.stale", f"{tx.tx_id} is still in the mempool")
+                for key in keys:
+                    self._check(mempool.spent_utxos.get(key) != tx.tx_id, "mempool.stale",
+                                f"{key} is still marked spent by {tx.tx_id}")
+
+    # full audit
+
+    def audit(self):
+        """Rescan everything and cross-check the running results"""
+        self.audits += 1
+        utxo, mempool = self.utxo, self.mempool
+
+        self._check(utxo.compute_commitment_full() == utxo.get_commitment(), "audit.commitment",
+                    "running MuHash differs from a full rebuild")
+        supply = 0.0
+        balances = defaultdict(float)
+        for data in utxo.utxo_set.values():
+            supply += data["amount"]
+            balances[data["owner"]] += data["amount"]
+        self._check(abs(supply - utxo.total_supply) <= SUPPLY_TOLERANCE
+                    and abs(supply - self.expected_supply) <= SUPPLY_TOLERANCE
+                    and abs(supply - self.genesis_supply) <= SUPPLY_TOLERANCE, "audit.supply",
+                    f"rescan {supply:.10f}, running {utxo.total_supply:.10f}, "
+                    f"expected {self.expected_supply:.10f}, genesis {self.genesis_supply:.10f}")
+        self._check(len(utxo.utxo_set) == utxo.coin_count == self.expected_coins, "audit.coin_count",
+                    f"rescan {len(utxo.utxo_set)}, running {utxo.coin_count}, "
+                    f"expected {self.expected_coins}")
+        for owner in set(balances) | set(self.balances):
+            self._check(abs(balances[owner] - self.balances[owner]) <= SUPPLY_TOLERANCE
+                        and balances[owner] >= -SUPPLY_TOLERANCE, "audit.balance",
+                        f"{owner}: rescan {balances[owner]:.10f}, running {self.balances[owner]:.10f}")
+
+        spent_utxos = {}
+        outputs = set()
+        for tx in mempool.transactions:
+            for inp in tx.inputs:
+                key = (inp["prev_tx"], inp["index"])
+                spent_utxos[key] = tx.tx_id
+                self._check(utxo.exists(*key), "audit.mempool_input",
+                            f"{tx.tx_id} spends {key}, which is not confirmed")
+            outputs.update((tx.tx_id, idx) for idx in range(len(tx.outputs)))
+        self._check(spent_utxos == mempool.spent_utxos, "audit.spent_utxos",
+                    "spent_utxos does not match the mempool's transactions")
+        self._check([tx.tx_id for tx in mempool.transactions] == list(self.shadow), "audit.mempool",
+                    "mempool contents or eviction order differ from the prediction")
+        mempool.view(utxo)   # builds the overlay on the first audit
+        self._check(set(mempool.unconfirmed.spent) == set(spent_utxos)
+                    and set(mempool.unconfirmed.added) == outputs, "audit.overlay",
+                    "mempool overlay does not match its transactions")
+
+        # drop spent outpoints from the workload's coin list so it stays bounded
+        self.coins = [key for key in self.coins if key in utxo.utxo_set]
+        self.coin_set = set(self.coins)
+        self._sample_memory()
+
+    def _sample_memory(self):
+        if not tracemalloc.is_tracing():
+            return
+        current, _ = tracemalloc.get_traced_memory()
+        live = self.utxo.coin_count + len(self.mempool) + sum(len(b.transactions) for b in self.chain)
+        self.memory.append((self.ops, current, live))
+        if self._memory_baseline is None:
+            self._memory_baseline = (current, live, tracemalloc.take_snapshot())
+            return
+        base_bytes, base_live, base_snapshot = self._memory_baseline
+        # growth beyond what the change in live coins, transactions and blocks explains
+        per_object = base_bytes / max(base_live, 1)
+        self.memory_growth = int(current - base_bytes - (live - base_live) * per_object)
+        leaking = self.memory_growth > max(self.leak_tolerance * base_bytes, 1 << 20)
+        if leaking and self.leak is None:
+            top = tracemalloc.take_snapshot().compare_to(base_snapshot, "lineno")[:5]
+            self.leak = {"op": self.ops, "bytes": self.memory_growth, "top": [str(s) for s in top]}
+        self._check(not leaking, "memory.growth",
+                    f"{self.memory_growth / 1e6:.1f} MB not explained by live data")
+
+    # driver
+
+    def run(self, ops: Optional[int] = None, seconds: Optional[float] = None,
+            on_audit: Optional[Callable[["SoakRunner"], None]] = None) -> Dict:
+        """Run until `ops` more operations or `seconds` have passed; returns the report"""
+        started_tracing = self.track_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        target = self.ops + ops if ops is not None else None
+        started = time.perf_counter()
+        try:
+            while (target is None or self.ops < target) and \
+                    (seconds is None or time.perf_counter() - started < seconds):
+                self.step()
+                if self.ops % self.audit_every == 0:
+                    self.audit()
+                    if on_audit is not None:
+                        on_audit(self)
+                if self.fail_fast and self.violation_count:
+                    break
+            self.audit()
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+        return self.report(time.perf_counter() - started)
+
+    def report(self, elapsed: float = 0.0) -> Dict:
+        return {
+            "ops": self.ops,
+            "seconds": elapsed,
+            "ops_per_second": self.ops / elapsed if elapsed > 0 else 0.0,
+            "height": self.height,
+            "utxos": self.utxo.coin_count,
+            "mempool": len(self.mempool),
+            "counts": dict(self.counts),
+            "checks": self.checks,
+            "audits": self.audits,
+            "violation_count": self.violation_count,
+            "violations": list(self.violations),
+            "violations_by_check": dict(self.violations_by_check),
+            "memory_bytes": self.memory[-1][1] if self.memory else 0,
+            "memory_growth": self.memory_growth,
+            "leak": self.leak,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Long-running soak test with invariant checks")
+    parser.add_argument("--hours", type=float, default=1.0, help="wall-clock duration")
+    parser.add_argument("--ops", type=int, default=None, help="stop after this many operations")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--mempool-size", type=int, default=500)
+    parser.add_argument("--txs-per-block", type=int, default=10)
+    parser.add_argument("--target-utxos", type=int, default=2000, help="UTXO set size the load settles at")
+    parser.add_argument("--audit-every", type=int, default=5000, help="operations between full audits")
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc (faster)")
+    parser.add_argument("--fail-fast", action="store_true", help="stop at the first violation")
+    args = parser.parse_args()
+
+    runner = SoakRunner(seed=args.seed, mempool_size=args.mempool_size,
+                        txs_per_block=args.txs_per_block, target_utxos=args.target_utxos,
+                        audit_every=args.audit_every,
+                        track_memory=not args.no_memory, fail_fast=args.fail_fast)
+    started = time.perf_counter()
+
+    def progress(r: SoakRunner):
+        mem = f", {r.memory[-1][1] / 1e6:.1f} MB traced" if r.memory else ""
+        print(f"[{time.perf_counter() - started:8.1f} s] {r.ops} ops, height {r.height}, "
+              f"{r.utxo.coin_count} utxos, {len(r.mempool)} in mempool, "
+              f"{r.violation_count} violations{mem}", flush=True)
+
+    try:
+        report = runner.run(ops=args.ops, seconds=args.hours * 3600 if args.ops is None else None,
+                            on_audit=progress)
+    except KeyboardInterrupt:
+        report = runner.report(time.perf_counter() - started)
+
+    print(f"{report['ops']} operations in {report['seconds']:.1f} s "
+          f"({report['ops_per_second']:.0f} ops/s), {report['checks']} checks, "
+          f"{report['audits']} full audits")
+    for k, v in sorted(report["counts"].items()):
+        print(f"  {k}: {v}")
+    print(f"Violations: {report['violation_count']}")
+    for name, count in sorted(report["violations_by_check"].items()):
+        print(f"  {name}: {count}")
+    if report["violations"]:
+        print("First violations:")
+    for op, name, message in report["violations"][:20]:
+        print(f"  op {op}: {name} - {message}")
+    if report["leak"] is not None:
+        print(f"Memory growth flagged at op {report['leak']['op']}:")
+        for line in report["leak"]["top"]:
+            print(f"  {line}")
+
+
+if __name__ == "__main__":
+    main()
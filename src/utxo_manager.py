@@ -1,7 +1,18 @@
+import json
+from typing import Dict, List, Tuple
+from muhash import MuHash
+
+
 class UTXOManager:
-    def __init__(self):
+    def __init__(self, genesis: bool = True):
         self.utxo_set = {}
-        self._create_genesis_block()
+        # Running state commitment, kept up to date by add_utxo / remove_utxo
+        self.muhash = MuHash()
+        self.total_supply = 0.0
+        self.coin_count = 0
+        self._batch = None   # (added, removed) entries while a batch is open
+        if genesis:
+            self._create_genesis_block()
 
     def _create_genesis_block(self):
         genesis_tx_id = "genesis"
@@ -10,19 +21,143 @@ class UTXOManager:
         self.add_utxo(genesis_tx_id, 2, 20.0, "Charlie")
         self.add_utxo(genesis_tx_id, 3, 10.0, "David")
         self.add_utxo(genesis_tx_id, 4, 5.0, "Eve")
-    
+
+    def copy(self) -> "UTXOManager":
+        """
+        Independent copy of this UTXO set.
+        Entries are never modified in place, only replaced, so the copy can
+        share them with the original and only the dict itself is duplicated.
+        """
+        clone = UTXOManager.__new__(UTXOManager)
+        clone.utxo_set = dict(self.utxo_set)
+        clone.muhash = self.muhash.copy()
+        clone.total_supply = self.total_supply
+        clone.coin_count = self.coin_count
+        clone._batch = None
+        return clone
+
+    @staticmethod
+    def _serialize(tx_id: str, index: int, amount: float, owner: str) -> bytes:
+        # float() so an int amount hashes like the equal float (49 and 49.0)
+        return json.dumps([tx_id, index, float(amount), owner]).encode()
+
     def add_utxo(self, tx_id: str, index: int, amount: float, owner: str):
         key = (tx_id, index)
+        if key in self.utxo_set:
+            # overwriting an existing output, take the old one out of the commitment
+            self.remove_utxo(tx_id, index)
         self.utxo_set[key] = {
             "amount": amount,
             "owner": owner
         }
-    
+        if self._batch is not None:
+            self._batch[0].append((tx_id, index, amount, owner))
+        else:
+            self.muhash.add(self._serialize(tx_id, index, amount, owner))
+        self.total_supply += amount
+        self.coin_count += 1
+
     def remove_utxo(self, tx_id: str, index: int):
         key = (tx_id, index)
         if key in self.utxo_set:
-            self.utxo_set.pop(key)
-        
+            data = self.utxo_set.pop(key)
+            if self._batch is not None:
+                self._batch[1].append((tx_id, index, data["amount"], data["owner"]))
+            else:
+                self.muhash.remove(self._serialize(tx_id, index, data["amount"], data["owner"]))
+            self.total_supply -= data["amount"]
+            self.coin_count -= 1
+
+    def begin_batch(self):
+        """Defer commitment updates until end_batch (used when connecting a block)"""
+        self._batch = ([], [])
+
+    def end_batch(self, memo: dict = None):
+        """
+        Fold the changes made since begin_batch into the commitment.
+        `memo` lets nodes applying the same block share the hashing work: if it
+        holds a delta for exactly these changes it is reused, otherwise the delta
+        is computed and stored in it.
+        """
+        added, removed = self._batch
+        self._batch = None
+        if memo is not None and memo.get("changes") == (added, removed):
+            delta = memo["delta"]
+        else:
+            delta = MuHash()
+            for entry in added:
+                delta.add(self._serialize(*entry))
+            for entry in removed:
+                delta.remove(self._serialize(*entry))
+            if memo is not None:
+                memo["changes"] = (added, removed)
+                memo["delta"] = delta
+        self.muhash.combine(delta)
+
+    def check_changes(self, ops: List[tuple]) -> Tuple[bool, str]:
+        """
+        Check that a list of ops can be applied in order without changing anything.
+        Ops are ("spend", tx_id, index) or ("add", tx_id, index, amount, owner).
+        """
+        spent = set()
+        created = set()
+        for op in ops:
+            key = (op[1], op[2])
+            if op[0] == "spend":
+                if key in spent or (key not in created and key not in self.utxo_set):
+                    return False, f"UTXO {key[0]}:{key[1]} does not exist"
+                spent.add(key)
+                created.discard(key)
+            else:
+                created.add(key)
+                spent.discard(key)
+        return True, "Changes are valid"
+
+    def apply_changes(self, ops: List[tuple], memo: dict = None) -> List[tuple]:
+        """
+        Apply ops (see check_changes) as one batch and return the spent entries
+        as (tx_id, index, amount, owner), in order.
+        Raises ValueError, without changing anything, if the ops do not apply.
+        """
+        ok, msg = self.check_changes(ops)
+        if not ok:
+            raise ValueError(msg)
+        spent = []
+        self.begin_batch()
+        for op in ops:
+            if op[0] == "spend":
+                data = self.utxo_set[(op[1], op[2])]
+                spent.append((op[1], op[2], data["amount"], data["owner"]))
+                self.remove_utxo(op[1], op[2])
+            else:
+                self.add_utxo(op[1], op[2], op[3], op[4])
+        self.end_batch(memo)
+        return spent
+
+    def get_entry(self, tx_id: str, index: int):
+        """The stored {"amount", "owner"} entry, or None if the output does not exist"""
+        return self.utxo_set.get((tx_id, index))
+
+    def get_amounts(self, keys: List[tuple]) -> Dict[tuple, float]:
+        """Amounts of the given outpoints that exist; missing ones are left out"""
+        result = {}
+        for key in keys:
+            data = self.utxo_set.get(key)
+            if data is not None:
+                result[key] = data["amount"]
+        return result
+
+    def get_commitment(self) -> str:
+        """Hash of the whole UTXO set, independent of insertion order (O(1) to maintain)"""
+        return self.muhash.digest()
+
+    def compute_commitment_full(self) -> str:
+        """Rebuild the commitment from scratch; used to audit the running one"""
+        full = MuHash()
+        for (tx_id, index), data in self.utxo_set.items():
+            full.add(self._serialize(tx_id, index, data["amount"], data["owner"]))
+        return full.digest()
+
     def get_amount(self, tx_id: str, index: int) -> float:
         key = (tx_id, index)
         if key not in self.utxo_set:
@@ -35,11 +170,11 @@ class UTXOManager:
             if utxo_data["owner"] == owner:
                 balance += utxo_data["amount"]
         return balance
-    
+
     def exists(self, tx_id: str, index: int) -> bool:
         key = (tx_id, index)
         return key in self.utxo_set
-    
+
     def get_utxos_for_owner(self, owner: str) -> list:
         utxos = []
         for key, utxo_data in self.utxo_set.items():
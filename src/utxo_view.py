@@ -0,0 +1,142 @@
+from typing import Dict, List, Optional, Tuple
+
+
+class UTXOView:
+    """
+    Copy-on-write layer over a UTXO set.
+
+    Reads fall through to the parent (a UTXOManager, a ShardedUTXOManager or
+    another UTXOView); writes only touch a small overlay of added outputs and
+    spent parent outputs. flush() pushes the overlay into the parent as one
+    batch, discard() throws it away in O(1). Views can be stacked, e.g. a
+    reorg branch on top of the chain state, and a candidate block on top of that.
+    """
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.added: Dict[tuple, dict] = {}   # outputs created in this layer
+        self.spent: Dict[tuple, dict] = {}   # parent outputs spent in this layer
+
+    # reads
+
+    def get_entry(self, tx_id: str, index: int) -> Optional[dict]:
+        key = (tx_id, index)
+        if key in self.added:
+            return self.added[key]
+        if key in self.spent or self.parent is None:
+            return None
+        return self.parent.get_entry(tx_id, index)
+
+    def exists(self, tx_id: str, index: int) -> bool:
+        return self.get_entry(tx_id, index) is not None
+
+    def get_amount(self, tx_id: str, index: int) -> float:
+        data = self.get_entry(tx_id, index)
+        if data is None:
+            raise ValueError(f"UTXO {(tx_id, index)} not found")
+        return data["amount"]
+
+    def get_amounts(self, keys: List[tuple]) -> Dict[tuple, float]:
+        result = {}
+        ask_parent = []
+        for key in keys:
+            if key in self.added:
+                result[key] = self.added[key]["amount"]
+            elif key not in self.spent:
+                ask_parent.append(key)
+        if ask_parent and self.parent is not None:
+            result.update(self.parent.get_amounts(ask_parent))
+        return result
+
+    def get_balance(self, owner: str) -> float:
+        balance = self.parent.get_balance(owner) if self.parent is not None else 0.0
+        for data in self.spent.values():
+            if data["owner"] == owner:
+                balance -= data["amount"]
+        for data in self.added.values():
+            if data["owner"] == owner:
+                balance += data["amount"]
+        return balance
+
+    def get_utxos_for_owner(self, owner: str) -> list:
+        utxos = []
+        if self.parent is not None:
+            for utxo in self.parent.get_utxos_for_owner(owner):
+                if (utxo["tx_id"], utxo["index"]) not in self.spent:
+                    utxos.append(utxo)
+        for (tx_id, index), data in self.added.items():
+            if data["owner"] == owner:
+                utxos.append({"tx_id": tx_id, "index": index, "amount": data["amount"]})
+        return utxos
+
+    # writes
+
+    def add_utxo(self, tx_id: str, index: int, amount: float, owner: str):
+        if self.exists(tx_id, index):
+            self.remove_utxo(tx_id, index)
+        self.added[(tx_id, index)] = {"amount": amount, "owner": owner}
+
+    def remove_utxo(self, tx_id: str, index: int):
+        key = (tx_id, index)
+        if key in self.added:
+            del self.added[key]
+        elif key not in self.spent and self.parent is not None:
+            data = self.parent.get_entry(tx_id, index)
+            if data is not None:
+                self.spent[key] = data
+
+    def revert(self, tx_id: str, index: int):
+        """Forget anything this layer did to one outpoint, so reads see the parent again"""
+        key = (tx_id, index)
+        self.added.pop(key, None)
+        self.spent.pop(key, None)
+
+    def check_changes(self, ops: List[tuple]) -> Tuple[bool, str]:
+        """Same contract as UTXOManager.check_changes"""
+        spent = set()
+        created = set()
+        for op in ops:
+            key = (op[1], op[2])
+            if op[0] == "spend":
+                if key in spent or (key not in created and not self.exists(*key)):
+                    return False, f"UTXO {key[0]}:{key[1]} does not exist"
+                spent.add(key)
+                created.discard(key)
+            else:
+                created.add(key)
+                spent.discard(key)
+        return True, "Changes are valid"
+
+    def apply_changes(self, ops: List[tuple], memo: dict = None) -> List[tuple]:
+        """Same contract as UTXOManager.apply_changes; `memo` is unused (nothing is hashed here)"""
+        ok, msg = self.check_changes(ops)
+        if not ok:
+            raise ValueError(msg)
+        spent = []
+        for op in ops:
+            if op[0] == "spend":
+                data = self.get_entry(op[1], op[2])
+                spent.append((op[1], op[2], data["amount"], data["owner"]))
+                self.remove_utxo(op[1], op[2])
+            else:
+                self.add_utxo(op[1], op[2], op[3], op[4])
+        return spent
+
+    # layer control
+
+    def flush(self, memo: dict = None):
+        """Apply this layer to the parent as one batch and empty it"""
+        ops = [("spend", tx_id, index) for tx_id, index in self.spent]
+        ops.extend(("add", tx_id, index, data["amount"], data["owner"])
+                   for (tx_id, index), data in self.added.items())
+        if ops:
+            self.parent.apply_changes(ops, memo)
+        self.discard()
+
+    def discard(self):
+        """Drop every change in this layer (O(1))"""
+        self.added = {}
+        self.spent = {}
+
+    def __len__(self) -> int:
+        return len(self.added) + len(self.spent)
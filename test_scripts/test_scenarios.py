@@ -6,7 +6,15 @@ sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
 from utxo_manager import UTXOManager
 from mempool import Mempool
 from transaction import Transaction
-from block import mine_block
+from block import Block, mine_block, connect_block, disconnect_block, validate_block
+from fee_estimator import FeeEstimator
+from network_sim import NO_SENDER, NetworkSimulator, Topology
+from rpc_server import RPCNode, RPCServer
+from rpc_loadtest import run_load
+from sharded_utxo import ShardedUTXOManager
+from utxo_view import UTXOView
+from soak import SoakRunner
+from block_store import BlockStore
 
 
 def run_all_tests():
@@ -24,7 +32,17 @@ def run_all_tests():
         test_7_zero_fee_transaction,
         test_8_race_attack_simulation,
         test_9_complete_mining_flow,
-        test_10_unconfirmed_chain
+        test_10_unconfirmed_chain,
+        test_11_block_reconciliation,
+        test_12_fee_estimation,
+        test_13_utxo_commitment,
+        test_14_network_simulation,
+        test_15_json_rpc_server,
+        test_16_sharded_utxo_manager,
+        test_17_utxo_view_layers,
+        test_18_soak_invariants,
+        test_19_block_store,
+        test_20_stale_mempool_transaction
     ]
     
     passed = 0
@@ -350,7 +368,452 @@ def test_10_unconfirmed_chain():
     return success1 and not success2 and "does not exist" in msg2
 
 
+def test_11_block_reconciliation():
+    """Test 11: Block Reconciliation"""
+    print("Test 11: Block Reconciliation")
+    print("Block confirms one TX and conflicts with another, then is disconnected")
+
+    utxo = UTXOManager()
+    mempool = Mempool()
+
+    tx1 = Transaction("recon_tx1", [{"prev_tx": "genesis", "index": 0, "owner": "Alice"}],
+                      [{"amount": 49.0, "address": "Bob"}, {"amount": 0.99, "address": "Alice"}])
+    tx2 = Transaction("recon_tx2", [{"prev_tx": "genesis", "index": 1, "owner": "Bob"}],
+                      [{"amount": 29.0, "address": "Charlie"}, {"amount": 0.99, "address": "Bob"}])
+    mempool.add_transaction(tx1, utxo)
+    mempool.add_transaction(tx2, utxo)
+
+    # A competing spend of Bob's UTXO arrives in a block from another miner
+    rival = Transaction("recon_rival", [{"prev_tx": "genesis", "index": 1, "owner": "Bob"}],
+                        [{"amount": 30.0, "address": "Eve"}])
+    stats = mempool.block_connected(Block([tx1, rival], "Rival"))
+
+    print(f"Block connected: {stats}")
+    connect_ok = (stats == {"confirmed": 1, "conflicts": 1}
+                  and not mempool.transactions and not mempool.spent_utxos)
+
+    # Mine a real block, then disconnect it again
+    mempool.add_transaction(tx1, utxo)
+    block = mine_block("Miner", mempool, utxo)
+    mined_ok = block is not None and not utxo.exists("genesis", 0)
+
+    # A child of the mined TX loses its parent output when the block goes away
+    child = Transaction("recon_child", [{"prev_tx": "recon_tx1", "index": 0, "owner": "Bob"}],
+                        [{"amount": 48.0, "address": "Charlie"}])
+    mempool.add_transaction(child, utxo)
+    stats = disconnect_block(block, mempool, utxo)
+
+    print(f"Block disconnected: {stats}")
+    print(f"Mempool after disconnect: {len(mempool.transactions)} transactions")
+
+    return (connect_ok and mined_ok and stats["restored"] == 1 and stats["orphaned"] == 1
+            and "recon_child" not in [tx.tx_id for tx in mempool.transactions]
+            and utxo.exists("genesis", 0) and utxo.get_balance("Miner") == 0.0
+            and ("genesis", 0) in mempool.spent_utxos)
+
+
+def test_12_fee_estimation():
+    """Test 12: Fee Estimation"""
+    print("Test 12: Fee Estimation")
+    print("High-fee TXs confirm next block, low-fee TXs wait 5 blocks")
+
+    estimator = FeeEstimator()
+    for height in range(1, 21):
+        estimator.process_block(height, [(50.0, 1), (2.0, 5)])
+
+    fast = estimator.estimate_fee(1)
+    slow = estimator.estimate_fee(6)
+    print(f"Estimate for 1 block: {fast} sat/byte")
+    print(f"Estimate for 6 blocks: {slow} sat/byte")
+
+    # Many fast high-fee TXs must not carry a few slow low-fee ones below them
+    mixed = FeeEstimator()
+    for height in range(1, 21):
+        mixed.process_block(height, [(50.0, 1)] * 20 + [(2.0, 10)])
+    print(f"Mixed workload: {mixed.estimate_fee(1)} sat/byte for 1 block, "
+          f"{mixed.estimate_fee(10)} for 10 blocks")
+    mixed_ok = (abs(mixed.estimate_fee(1) - 50.0) < 1e-6
+                and abs(mixed.estimate_fee(10) - 2.0) < 1e-6)
+
+    # Estimates survive a save/load round trip
+    import json
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "fee_estimates.json")
+        estimator.save(path)
+        reloaded = FeeEstimator.load(path)
+
+        # A file missing a field starts a fresh estimator instead of crashing
+        with open(path) as f:
+            state = json.load(f)
+        del state["rate_sums"]
+        with open(path, "w") as f:
+            json.dump(state, f)
+        damaged = FeeEstimator.load(path)
+
+    # Mining through the mempool feeds the estimator
+    utxo = UTXOManager()
+    mempool = Mempool(fee_estimator=FeeEstimator())
+    tx = Transaction("fee_est_tx", [{"prev_tx": "genesis", "index": 0, "owner": "Alice"}],
+                     [{"amount": 49.0, "address": "Bob"}, {"amount": 0.99, "address": "Alice"}])
+    mempool.add_transaction(tx, utxo)
+    mine_block("Miner", mempool, utxo)
+    mined = mempool.fee_estimator.estimate_fee(1)
+    print(f"Estimate after one mined block: {mined} sat/byte")
+
+    return (abs(fast - 50.0) < 1e-6 and abs(slow - 2.0) < 1e-6 and mixed_ok
+            and reloaded.estimate_fee(1) == fast and reloaded.estimate_fee(6) == slow
+            and damaged.best_height == 0 and damaged.estimate_fee(1) is None
+            and mined is not None and abs(mined - tx.fee_rate) < 1e-6)
+
+
+def test_13_utxo_commitment():
+    """Test 13: UTXO Set Commitment"""
+    print("Test 13: UTXO Set Commitment")
+    print("Two nodes reach the same UTXO set by different routes")
+
+    node_a = UTXOManager()
+    node_b = UTXOManager()
+
+    # Node A mines Alice's payment; node B applies the same changes in another order
+    mempool = Mempool()
+    tx = Transaction("commit_tx", [{"prev_tx": "genesis", "index": 0, "owner": "Alice"}],
+                     [{"amount": 20.0, "address": "Bob"}, {"amount": 30.0, "address": "Alice"}])
+    mempool.add_transaction(tx, node_a)
+    block = mine_block("Miner", mempool, node_a)
+
+    node_b.add_utxo("commit_tx", 1, 30.0, "Alice")
+    node_b.add_utxo("commit_tx", 0, 20.0, "Bob")
+    node_b.remove_utxo("genesis", 0)
+
+    commit_a = node_a.get_commitment()
+    commit_b = node_b.get_commitment()
+    print(f"Node A commitment: {commit_a[:16]}...")
+    print(f"Node B commitment: {commit_b[:16]}...")
+    print(f"Supply: {node_a.total_supply} BTC in {node_a.coin_count} coins")
+
+    # A single diverging coin changes the commitment
+    node_b.add_utxo("rogue", 0, 1.0, "Eve")
+    diverged = node_b.get_commitment() != commit_a
+    node_b.remove_utxo("rogue", 0)
+
+    # An int amount (e.g. from a JSON-RPC client) commits like the equal float
+    int_node = UTXOManager(genesis=False)
+    float_node = UTXOManager(genesis=False)
+    int_node.add_utxo("amount_tx", 0, 49, "Bob")
+    float_node.add_utxo("amount_tx", 0, 49.0, "Bob")
+    same_amount = (int_node.utxo_set == float_node.utxo_set
+                   and int_node.get_commitment() == float_node.get_commitment())
+    print(f"Int and float amounts agree: {same_amount}")
+
+    return (commit_a == commit_b and block.utxo_commitment == commit_a
+            and commit_a == node_a.compute_commitment_full()
+            and diverged and node_b.get_commitment() == commit_a and same_amount
+            and node_a.total_supply == 115.0 and node_a.coin_count == 6)
+
+
+def test_14_network_simulation():
+    """Test 14: Network Simulation"""
+    print("Test 14: Network Simulation")
+    print("50 nodes, one double-spender, a partition that heals, 2 simulated hours")
+
+    topology = Topology.random_graph(50, degree=6, seed=7)
+    topology.add_partition(1200, 2400, set(range(20)))
+    sim = NetworkSimulator(topology, strategies={49: "double_spend"},
+                           miners={i: 1.0 for i in range(0, 50, 5)},
+                           tx_rate=0.2, attack_rate=1 / 900, funding_coins=200, seed=7)
+    summary = sim.run(2 * 3600)
+
+    print(f"Events: {summary['events']}, best height: {summary['best_height']}")
+    print(f"Distinct tips: {summary['distinct_tips']}, nodes on best tip: {summary['nodes_on_best_tip']}")
+    print(f"Double-spend attempts: {summary['double_spend_attempts']}")
+
+    # Every attack ends with at most one side confirmed on any node
+    one_side = all(not (node.utxo.exists(honest.tx_id, 0) and node.utxo.exists(cheat.tx_id, 0))
+                   for _, honest, cheat in sim.attacks for node in sim.nodes)
+    one_side = one_side and summary["double_spends_confirmed"] == 0
+    print(f"Attacker's side confirmed: {summary['cheat_side_confirmed']}, "
+          f"both sides on one node: {summary['double_spends_confirmed']}")
+
+    # A tx dropped at a cut link still arrives through another peer once the cut heals
+    topology = Topology(3)
+    topology.connect(0, 1, 0.05, 1e6)
+    topology.connect(0, 2, 6.0, 1e6)
+    topology.connect(2, 1, 0.05, 1e6)
+    topology.add_partition(0, 5, {1})
+    small = NetworkSimulator(topology, miners={}, tx_rate=0, funding_coins=1, seed=7)
+    tx = Transaction("cut_tx", [{"prev_tx": "funding", "index": 0, "owner": "user0"}],
+                     [{"amount": 0.9, "address": "user1"}])
+    small.nodes[0].strategy.on_transaction(small, small.nodes[0], tx, NO_SENDER)
+    small.run(10)
+    healed = "cut_tx" in small.nodes[1].mempool and "cut_tx" not in small.tx_seen
+    print(f"Tx across a healed cut reached node 1: {healed}")
+
+    return (summary["best_height"] > 0 and summary["double_spend_attempts"] > 0
+            and summary["totals"]["messages_dropped"] > 0
+            and not summary["utxo_divergence"] and one_side and healed
+            and len(sim.node_metrics()) == 50)
+
+
+def test_15_json_rpc_server():
+    """Test 15: JSON-RPC Server"""
+    print("Test 15: JSON-RPC Server")
+    print("Batch request over TCP, then a short pipelined load test")
+
+    import asyncio
+    import json
+
+    async def scenario():
+        server = RPCServer(RPCNode(), port=0)
+        await server.start()
+        try:
+            reader, writer = await asyncio.open_connection(server.host, server.port)
+            tx = {"tx_id": "rpc_tx1",
+                  "inputs": [{"prev_tx": "genesis", "index": 0, "owner": "Alice"}],
+                  "outputs": [{"amount": 49.0, "address": "Bob"}, {"amount": 0.99, "address": "Alice"}]}
+            batch = [
+                {"jsonrpc": "2.0", "id": 1, "method": "sendrawtransaction", "params": [tx]},
+                {"jsonrpc": "2.0", "id": 2, "method": "sendrawtransaction", "params": [tx]},
+                {"jsonrpc": "2.0", "id": 3, "method": "getmempoolinfo"},
+                {"jsonrpc": "2.0", "id": 4, "method": "generate", "params": {"nblocks": 1}},
+                {"jsonrpc": "2.0", "id": 5, "method": "getbalance", "params": ["Bob"]},
+                {"jsonrpc": "2.0", "id": 6, "method": "nosuchmethod"},
+                {"jsonrpc": "2.0", "method": "getmempoolinfo"},   # notification, no reply
+            ]
+            writer.write(json.dumps(batch).encode() + b"\n")
+            await writer.drain()
+            responses = {r["id"]: r for r in json.loads(await reader.readline())}
+            writer.close()
+
+            # 50 calls in batches of 8: the last batch only carries 2
+            before = server.requests_served
+            report = await run_load(server.host, server.port, clients=4, requests=50,
+                                    batch=8, pipeline=4)
+            return responses, report, server.requests_served - before
+        finally:
+            await server.close()
+
+    responses, report, served = asyncio.run(scenario())
+    for request_id in sorted(responses):
+        print(f"  {request_id}: {responses[request_id].get('result', responses[request_id].get('error'))}")
+    print(f"Load test: {report['requests']} requests ({served} served), "
+          f"{report['requests_per_second']:.0f} req/s, p99 {report['p99_ms']:.2f} ms")
+
+    return (len(responses) == 6
+            and responses[1]["result"] == "rpc_tx1"
+            and responses[2]["error"]["code"] == -26
+            and responses[3]["result"]["size"] == 1
+            and len(responses[4]["result"]) == 1
+            and responses[5]["result"] == 79.0
+            and responses[6]["error"]["code"] == -32601
+            and report["requests"] == served == 200 and report["errors"] == 0)
+
+
+def test_16_sharded_utxo_manager():
+    """Test 16: Sharded UTXO Manager"""
+    print("Test 16: Sharded UTXO Manager")
+    print("Mine the same block on 4 shards and on one process; a bad block changes nothing")
+
+    with ShardedUTXOManager(num_shards=4) as sharded:
+        single = UTXOManager()
+        for utxo in (sharded, single):
+            mempool = Mempool()
+            for i, (owner, amount) in enumerate([("Alice", 50.0), ("Bob", 30.0), ("Charlie", 20.0)]):
+                tx = Transaction(f"shard_tx{i}", [{"prev_tx": "genesis", "index": i, "owner": owner}],
+                                 [{"amount": amount - 1.0, "address": "Eve"}, {"amount": 0.99, "address": owner}])
+                mempool.add_transaction(tx, utxo)
+            mine_block("Miner", mempool, utxo)
+
+        same_state = (sharded.get_commitment() == single.get_commitment()
+                      and sharded.get_balance("Eve") == single.get_balance("Eve")
+                      and sharded.coin_count == single.coin_count)
+        print(f"Sharded and single-process sets match: {same_state}")
+
+        # David's input is valid, the second input is not: no shard may apply any of it
+        before = sharded.get_commitment()
+        bad = Block([Transaction("shard_bad", [{"prev_tx": "genesis", "index": 3, "owner": "David"},
+                                               {"prev_tx": "missing", "index": 0, "owner": "David"}],
+                                 [{"amount": 10.0, "address": "Mallory"}])], "Miner")
+        ok, msg = connect_block(bad, Mempool(), sharded)
+        print(f"Bad block: {'ACCEPTED' if ok else 'REJECTED'} - {msg}")
+
+        # The same changes sent straight to the two-phase commit are aborted on every shard
+        try:
+            sharded.apply_changes([("spend", "genesis", 3), ("spend", "missing", 0)])
+            aborted = False
+        except ValueError:
+            aborted = True
+        print(f"Two-phase commit aborted: {aborted}")
+
+        return (same_state and not ok and aborted and sharded.exists("genesis", 3)
+                and sharded.get_commitment() == before)
+
+
+def test_17_utxo_view_layers():
+    """Test 17: UTXO View Layers"""
+    print("Test 17: UTXO View Layers")
+    print("Stack views over the UTXO set; only flush() reaches the real set")
+
+    utxo = UTXOManager()
+    before = utxo.get_commitment()
+
+    branch = UTXOView(utxo)
+    branch.apply_changes([("spend", "genesis", 0), ("add", "view_tx", 0, 50.0, "Bob")])
+    candidate = UTXOView(branch)
+    candidate.apply_changes([("spend", "view_tx", 0), ("add", "view_tx2", 0, 50.0, "Charlie")])
+    print(f"Charlie's balance: base {utxo.get_balance('Charlie')}, branch {branch.get_balance('Charlie')}, "
+          f"candidate {candidate.get_balance('Charlie')}")
+    layered = (utxo.get_balance("Charlie") == 20.0 and branch.get_balance("Charlie") == 20.0
+               and candidate.get_balance("Charlie") == 70.0 and utxo.exists("genesis", 0))
+
+    candidate.discard()
+    branch.flush()
+    flushed = (not utxo.exists("genesis", 0) and utxo.get_balance("Bob") == 80.0
+               and utxo.get_commitment() == utxo.compute_commitment_full())
+    print(f"Discarded candidate, flushed branch: {flushed}")
+
+    # A block is fully validated without touching the set it is checked against
+    utxo = UTXOManager()
+    block = Block([Transaction("view_blk", [{"prev_tx": "genesis", "index": 1, "owner": "Bob"}],
+                               [{"amount": 29.0, "address": "Eve"}])], "Miner")
+    ok, msg = validate_block(block, utxo)
+    print(f"validate_block: {ok} - {msg}")
+    untouched = utxo.get_commitment() == before and utxo.exists("genesis", 1)
+
+    # The mempool's view shows unconfirmed outputs and hides outputs it already spends
+    mempool = Mempool()
+    mempool.add_transaction(Transaction("view_mp", [{"prev_tx": "genesis", "index": 2, "owner": "Charlie"}],
+                                        [{"amount": 19.0, "address": "David"}]), utxo)
+    view = mempool.view(utxo)
+    mempool_view = (view.exists("view_mp", 0) and not view.exists("genesis", 2)
+                    and view.get_balance("David") == 29.0 and utxo.get_balance("David") == 10.0)
+    # once built, the overlay follows the pool without a rebuild
+    overlay = mempool.unconfirmed
+    mempool.add_transaction(Transaction("view_mp2", [{"prev_tx": "genesis", "index": 4, "owner": "Eve"}],
+                                        [{"amount": 4.0, "address": "David"}]), utxo)
+    print(f"Mempool view: David {mempool.view(utxo).get_balance('David')} "
+          f"(confirmed {utxo.get_balance('David')})")
+    mempool_view = mempool_view and mempool.view(utxo).get_balance("David") == 33.0
+    mempool.remove_transaction("view_mp")
+    mempool_view = (mempool_view and mempool.unconfirmed is overlay
+                    and mempool.view(utxo).get_balance("David") == 14.0
+                    and mempool.view(utxo).exists("genesis", 2))
+    # a view over another UTXO set gets an overlay of its own
+    other = mempool.view(UTXOManager(genesis=False))
+    mempool_view = mempool_view and other.get_balance("David") == 4.0
+
+    return layered and flushed and ok and untouched and mempool_view
+
+
+def test_18_soak_invariants():
+    """Test 18: Soak Invariants"""
+    print("Test 18: Soak Invariants")
+    print("Random load with reorgs and rival blocks; then corrupt state and expect it caught")
+
+    runner = SoakRunner(seed=7, audit_every=1000, track_memory=False)
+    report = runner.run(ops=4000)
+    print(f"{report['ops']} ops, height {report['height']}, {report['checks']} checks, "
+          f"{report['audits']} audits, {report['violation_count']} violations")
+    for op, name, message in report["violations"][:5]:
+        print(f"  op {op}: {name} - {message}")
+    clean = (report["violation_count"] == 0 and report["counts"].get("blocks_disconnected", 0) > 0
+             and report["counts"].get("conflicts_evicted", 0) > 0)
+
+    # a stray spent_utxos entry and a drifted supply counter
+    runner.mempool.spent_utxos[("ghost", 0)] = "ghost_tx"
+    runner.utxo.total_supply += 1.0
+    report = runner.run(ops=200)
+    caught = set(report["violations_by_check"])
+    print(f"Corruption caught by: {', '.join(sorted(caught))}")
+
+    return clean and "mempool.spent_utxos" in caught and "audit.supply" in caught
+
+
+def test_19_block_store():
+    """Test 19: Flat-File Block Store"""
+    print("Test 19: Flat-File Block Store")
+    print("Store a chain across rotating files, read it back by index, reindex from the files")
+
+    import shutil
+    import tempfile
+
+    directory = tempfile.mkdtemp()
+    try:
+        utxo = UTXOManager()
+        mempool = Mempool()
+        store = BlockStore(directory, max_file_size=16 * 1024, prealloc_chunk=4 * 1024)
+        tip = None
+        prev_tx, amount = "genesis", 50.0
+        for i in range(60):
+            tx = Transaction(f"store_tx{i}", [{"prev_tx": prev_tx, "index": 0, "owner": "Alice"}],
+                             [{"amount": amount - 0.001, "address": "Alice"}])
+            mempool.add_transaction(tx, utxo)
+            tip = mine_block("Miner", mempool, utxo, prev_block=tip, timestamp=float(i))
+            store.add_block(tip)
+            prev_tx, amount = tx.tx_id, amount - 0.001
+        store.close()
+
+        files = sorted(name for name in os.listdir(directory) if name.endswith(".dat"))
+        print(f"60 blocks in {len(files)} files: {', '.join(files)}")
+
+        store = BlockStore(directory, max_file_size=16 * 1024, prealloc_chunk=4 * 1024)
+        by_height = store.get_block_by_height(30)
+        found = store.get_transaction("store_tx29")   # block 1 holds store_tx0
+        lookups = (store.height == 60 and store.tip.block_hash == tip.block_hash
+                   and by_height is not None and by_height.block_hash == store.get_block_hash(30)
+                   and found is not None and found[1] == by_height.block_hash
+                   and found[0].outputs == by_height.transactions[0].outputs)
+        print(f"Reopened store: height {store.height}, lookups by hash/height/txid ok: {lookups}")
+
+        loaded = store.load_utxo()
+        store.close()
+
+        # without the index, everything comes back from a sequential scan
+        os.remove(os.path.join(directory, "index.sqlite"))
+        store = BlockStore(directory)
+        rebuilt, report = store.reindex()
+        print(f"Reindexed {report['blocks']} blocks ({report['bytes']} bytes), "
+              f"connected {report['connected']}")
+        reindexed = (report["connected"] == 60
+                     and rebuilt.get_commitment() == utxo.get_commitment()
+                     and loaded.get_commitment() == utxo.get_commitment()
+                     and store.get_transaction("store_tx59") is not None)
+        print(f"UTXO set rebuilt from the files matches the live one: {reindexed}")
+        store.close()
+
+        return len(files) > 1 and lookups and reindexed
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
 # Legacy functions for backward compatibility
+def test_20_stale_mempool_transaction():
+    """Test 20: Stale Mempool Transaction"""
+    print("Test 20: Stale Mempool Transaction")
+    print("A TX whose input left the UTXO set is evicted; the valid TX is still mined")
+
+    utxo = UTXOManager()
+    mempool = Mempool()
+
+    stale = Transaction("stale_tx", [{"prev_tx": "genesis", "index": 2, "owner": "Charlie"}],
+                        [{"amount": 19.0, "address": "Alice"}])
+    valid = Transaction("stale_valid", [{"prev_tx": "genesis", "index": 3, "owner": "David"}],
+                        [{"amount": 9.0, "address": "Eve"}])
+    mempool.add_transaction(stale, utxo)
+    mempool.add_transaction(valid, utxo)
+    # the stale TX's input is spent behind the mempool's back
+    utxo.remove_utxo("genesis", 2)
+
+    block = mine_block("Miner", mempool, utxo)
+    mined = [tx.tx_id for tx in block.transactions] if block is not None else []
+    print(f"Mined: {mined}, mempool now holds {len(mempool)} transactions")
+    again = mine_block("Miner", mempool, utxo)
+
+    return (mined == ["stale_valid"] and utxo.exists("stale_valid", 0)
+            and len(mempool) == 0 and again is None
+            and utxo.get_balance("Miner") == 1.0)
+
+
 def test_double_spend():
     return test_4_mempool_double_spend()
 